@@ -0,0 +1,153 @@
+'''
+Run snyk_access.main end to end against the fake Snyk API in
+bench/fake_snyk.py and report wall time, requests per second, bytes
+received (and decompressed) and peak memory at each size. Peak memory is
+traced in a second run against a fresh fake API, so tracing doesn't slow
+the timed one:
+
+    PYTHONPATH=. python bench/bench_end_to_end.py --sizes 100 1000 10000
+
+A tenth of the repos in each access file is new and a tenth of the org's
+repos is no longer listed, so every run imports and deletes.
+'''
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+from urllib.request import urlopen
+
+import snyk_access
+from snyk_access import RunOptions
+
+
+FAKE_SNYK = os.path.join(os.path.dirname(__file__), 'fake_snyk.py')
+
+
+def write_access_file(filename: str, n_repos: int) -> None:
+    start = n_repos // 10
+    repos = [f'repo-{i}' for i in range(start, start + n_repos)]
+    with open(filename, 'w') as f:
+        json.dump([
+            {'apps': {'snyk': True}, 'repos': repos[i:i + 100]}
+            for i in range(0, len(repos), 100)
+        ], f)
+
+
+@contextmanager
+def fake_snyk(n_repos: int, args: argparse.Namespace) -> Iterator[str]:
+    '''Serve a fresh fake API with `n_repos` repos and yield its URL.'''
+    server = subprocess.Popen(
+        [
+            sys.executable, FAKE_SNYK,
+            '--repos', str(n_repos),
+            '--latency', str(args.latency),
+            '--throttle-every', str(args.throttle_every),
+            '--page-size', str(args.page_size),
+            *([] if args.compress else ['--no-compress']),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert server.stdout is not None
+        yield server.stdout.readline().strip()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def reconcile(
+    url: str, n_repos: int, args: argparse.Namespace,
+) -> List[Dict[str, Any]]:
+    '''Run snyk_access.main against `url` and return its endpoint metrics.'''
+    os.environ['SNYK_API_URL'] = url
+    with tempfile.TemporaryDirectory() as dir:
+        access_file = os.path.join(dir, 'access.json')
+        metrics_file = os.path.join(dir, 'metrics.json')
+        write_access_file(access_file, n_repos)
+        snyk_access.main('owner', 'bench', access_file, RunOptions(
+            workers=args.workers,
+            max_rps=0,
+            max_retries=args.max_retries,
+            metrics_file=metrics_file,
+        ))
+        with open(metrics_file) as f:
+            return json.load(f)['endpoints']
+
+
+def peak_memory(n_repos: int, args: argparse.Namespace) -> int:
+    '''
+    Peak memory traced over a run against a fresh fake API. tracemalloc
+    slows everything down several-fold, so this is kept out of the timed
+    run.
+    '''
+    with fake_snyk(n_repos, args) as url:
+        tracemalloc.start()
+        try:
+            reconcile(url, n_repos, args)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+
+def run(n_repos: int, args: argparse.Namespace) -> None:
+    with fake_snyk(n_repos, args) as url:
+        start = time.perf_counter()
+        endpoints = reconcile(url, n_repos, args)
+        elapsed = time.perf_counter() - start
+        with urlopen(f'{url.split("/api/")[0]}/stats') as response:
+            requests = json.load(response)['requests']
+    received = sum(endpoint['bytes_received'] for endpoint in endpoints)
+    decoded = sum(endpoint['bytes_decoded'] for endpoint in endpoints)
+    peak = (
+        f' {peak_memory(n_repos, args) / 2**20:8.1f} MiB peak'
+        if args.memory else ''
+    )
+    print(
+        f'{n_repos:>8} repos {elapsed:8.2f}s {requests:>7} requests '
+        f'{requests / elapsed:8.1f} req/s '
+        f'{received / 2**20:7.1f} MiB in ({decoded / 2**20:.1f} decoded)'
+        f'{peak}'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+    )
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-retries', type=int, default=5)
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='Seconds the fake API waits before each response',
+    )
+    parser.add_argument(
+        '--throttle-every', type=int, default=0,
+        help='Have the fake API answer every Nth request with a 429',
+    )
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument(
+        '--no-compress', dest='compress', action='store_false',
+        help='Have the fake API send uncompressed responses',
+    )
+    parser.add_argument(
+        '--no-memory', dest='memory', action='store_false',
+        help='Skip the separate run that measures peak memory',
+    )
+    args = parser.parse_args()
+    os.environ.setdefault('SNYK_TOKEN', 'bench')
+    snyk_access.logger.setLevel(logging.WARNING)
+    for n_repos in args.sizes:
+        run(n_repos, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+'''
+Time the in-memory reconcile routines on synthetic data:
+
+    PYTHONPATH=. python bench/bench_reconcile.py --projects 100000
+'''
+import argparse
+import time
+from unittest.mock import MagicMock
+
+import snyk
+import snyk_access
+
+
+def make_data(n_repos: int):
+    return [
+        {
+            'apps': {'snyk': True},
+            'repos': [f'repo-{i}' for i in range(start, start + 100)],
+        }
+        for start in range(0, n_repos, 100)
+    ]
+
+
+def make_projects(n_projects: int, n_repos: int):
+    client = MagicMock(spec=snyk.HTTPClient)
+    org = MagicMock(spec=snyk.Org)
+    projects = []
+    for i in range(n_projects):
+        # A few manifests per repo, a share of repos no longer wanted, and
+        # some non-GitHub projects mixed in.
+        if i % 10 == 0:
+            attrs = {'id': str(i), 'name': f'img-{i}:latest', 'origin': 'ecr'}
+        else:
+            repo = i % (n_repos + n_repos // 10)
+            attrs = {
+                'id': str(i),
+                'name': f'owner/repo-{repo}:requirements-{i}.txt',
+                'origin': 'github',
+            }
+        projects.append(snyk.Project(client, attrs, org))
+    return projects
+
+
+def timed(label: str, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f'{label:<22} {time.perf_counter() - start:8.3f}s')
+    return result
+
+
+def main(n_projects: int, n_repos: int) -> None:
+    data = make_data(n_repos)
+    projects = make_projects(n_projects, n_repos)
+    print(f'{n_projects} projects, {n_repos} repos')
+    repos = timed('repos_to_import', snyk_access.repos_to_import, data)
+    by_repo = timed('index_by_repo', snyk.index_by_repo, projects)
+    plan = timed(
+        'plan_changes', snyk_access.plan_changes, by_repo, repos, 'owner',
+    )
+    timed('projects_to_delete', snyk_access.projects_to_delete, projects,
+          repos, 'owner')
+    print(
+        f'{len(plan.to_import)} to import, {len(plan.to_delete)} to delete, '
+        f'{len(plan.unchanged)} unchanged'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--projects', type=int, default=100000)
+    parser.add_argument('--repos', type=int, default=20000)
+    args = parser.parse_args()
+    main(args.projects, args.repos)
@@ -0,0 +1,234 @@
+'''
+A local stand-in for the Snyk API endpoints snyk_access uses, with optional
+latency, 429 throttling, gzip responses and paginated project listings:
+
+    python bench/fake_snyk.py --repos 10000 --latency 0.005 --throttle-every 50
+
+Prints the API URL to use, e.g. as SNYK_API_URL, then serves until killed.
+GET /stats returns how many requests it has served.
+'''
+import argparse
+import gzip
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+ORG_ID = 'org-1'
+GROUP_ID = 'group-1'
+INTEGRATION_ID = 'github-1'
+
+
+class FakeSnyk(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        owner: str = 'owner',
+        org: str = 'bench',
+        repos: int = 0,
+        latency: float = 0.0,
+        throttle_every: int = 0,
+        page_size: int = 1000,
+        port: int = 0,
+        compress: bool = True,
+    ):
+        super().__init__(('127.0.0.1', port), Handler)
+        self.owner = owner
+        self.org = org
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.page_size = page_size
+        self.compress = compress
+        self.requests = 0
+        self.projects: Dict[str, Dict[str, Any]] = {}
+        self.jobs: Dict[str, List[str]] = {}
+        self.lock = threading.Lock()
+        for i in range(repos):
+            self.add_project(f'repo-{i}')
+            if i % 10 == 0:
+                self.add_project(f'repo-{i}', 'Dockerfile', 'github')
+                self.add_project(f'image-{i}', 'latest', 'ecr')
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}/api/v1/'
+
+    def add_project(
+        self,
+        repo: str,
+        file: str = 'requirements.txt',
+        origin: str = 'github',
+    ) -> None:
+        id = f'project-{len(self.projects)}-{repo}'
+        self.projects[id] = {
+            'id': id,
+            'name': f'{self.owner}/{repo}:{file}',
+            'origin': origin,
+            'type': 'pip',
+        }
+
+    def count_request(self) -> bool:
+        '''Count a request and return whether to throttle it.'''
+        with self.lock:
+            self.requests += 1
+            return bool(
+                self.throttle_every and
+                self.requests % self.throttle_every == 0
+            )
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    server: FakeSnyk
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(
+        self,
+        status: int,
+        body: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        content = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        accepted = self.headers.get('Accept-Encoding', '')
+        if content and self.server.compress and 'gzip' in accepted:
+            content = gzip.compress(content, compresslevel=6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def handle_request(self) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        url = urlsplit(self.path)
+        if url.path == '/stats':
+            return self.send(200, {'requests': self.server.requests})
+        throttled = self.server.count_request()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if throttled:
+            return self.send(429, {'message': 'slow down'}, {
+                'Retry-After': '0',
+            })
+        path = url.path[len('/api/v1/'):]
+        for pattern, handler in ROUTES:
+            match = re.fullmatch(pattern, f'{self.command} {path}')
+            if match:
+                query = parse_qs(url.query)
+                return handler(self, body, query, *match.groups())
+        self.send(404, {'message': f'no route for {self.command} {path}'})
+
+    do_GET = do_POST = do_DELETE = handle_request
+
+    def orgs(self, body, query):
+        self.send(200, {'orgs': [{
+            'name': self.server.org,
+            'id': ORG_ID,
+            'slug': self.server.org,
+            'group': {'name': 'bench', 'id': GROUP_ID},
+        }]})
+
+    def create_org(self, body, query, group_id):
+        self.send(201, {'name': body['name'], 'id': f'org-{body["name"]}'})
+
+    def integrations(self, body, query, org_id):
+        self.send(200, {'github': INTEGRATION_ID})
+
+    def start_import(self, body, query, org_id, integration_id):
+        targets = body.get('targets') or [body['target']]
+        repos = [target['name'] for target in targets]
+        with self.server.lock:
+            for repo in repos:
+                self.server.add_project(repo)
+            job = str(len(self.server.jobs))
+            self.server.jobs[job] = repos
+        self.send(201, {}, {'Location': (
+            f'{self.server.url}org/{org_id}/integrations/{integration_id}'
+            f'/import/{job}'
+        )})
+
+    def import_job(self, body, query, org_id, integration_id, job):
+        owner = self.server.owner
+        self.send(200, {'status': 'complete', 'logs': [
+            {'name': f'{owner}/{repo}', 'status': 'complete'}
+            for repo in self.server.jobs.get(job, [])
+        ]})
+
+    def list_projects(self, body, query, org_id):
+        filters = body.get('filters', {})
+        with self.server.lock:
+            projects = [
+                project for project in self.server.projects.values()
+                if all(project.get(k) == v for k, v in filters.items())
+            ]
+        page = int(query.get('page', ['0'])[0])
+        size = self.server.page_size
+        data: Dict[str, Any] = {
+            'projects': projects[page * size:(page + 1) * size],
+        }
+        if (page + 1) * size < len(projects):
+            data['links'] = {
+                'next': f'org/{org_id}/projects?page={page + 1}',
+            }
+        self.send(200, data)
+
+    def delete_project(self, body, query, org_id, project_id):
+        with self.server.lock:
+            found = self.server.projects.pop(project_id, None)
+        self.send(200 if found else 404)
+
+
+ROUTES: List[Tuple[str, Callable[..., None]]] = [
+    (r'GET orgs', Handler.orgs),
+    (r'POST group/([^/]+)/org', Handler.create_org),
+    (r'GET org/([^/]+)/integrations', Handler.integrations),
+    (r'POST org/([^/]+)/integrations/([^/]+)/import', Handler.start_import),
+    (r'GET org/([^/]+)/integrations/([^/]+)/import/([^/]+)',
+     Handler.import_job),
+    (r'(?:GET|POST) org/([^/]+)/projects', Handler.list_projects),
+    (r'DELETE org/([^/]+)/project/([^/]+)', Handler.delete_project),
+]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--owner', default='owner')
+    parser.add_argument('--org', default='bench')
+    parser.add_argument(
+        '--repos', type=int, default=0,
+        help='Repos to create GitHub projects for up front',
+    )
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='Seconds to wait before answering each request',
+    )
+    parser.add_argument(
+        '--throttle-every', type=int, default=0,
+        help='Answer every Nth request with a 429',
+    )
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument(
+        '--no-compress', dest='compress', action='store_false',
+        help='Ignore Accept-Encoding and always send uncompressed responses',
+    )
+    args = parser.parse_args()
+    server = FakeSnyk(
+        args.owner, args.org, args.repos, args.latency,
+        args.throttle_every, args.page_size, args.port, args.compress,
+    )
+    print(server.url, flush=True)
+    server.serve_forever()
@@ -9,68 +9,371 @@ snyk.orgs()
 from __future__ import annotations
 
 import json
-from urllib.parse import urljoin
-from urllib.request import urlopen, Request
-from typing import List, Dict, Any, Optional
+import threading
+from http.client import HTTPException, HTTPMessage, RemoteDisconnected
+from urllib.parse import urljoin, urlsplit
+from typing import (
+    List, Dict, Any, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple,
+    TypeVar,
+)
+
+from snyk.cache import CacheEntry, ResponseCache
+from snyk.encoding import ACCEPT_ENCODING, DecodingError, read_body
+from snyk.imports import (  # noqa: F401
+    ImportJob, ImportResult, wait_for_imports,
+)
+from snyk.metrics import Metrics
+from snyk.pool import ConnectionPool
+from snyk.ratelimit import RateLimitTimeout, TokenBucket
+from snyk.retry import IDEMPOTENT_METHODS, RetryPolicy
+from snyk.singleflight import SingleFlight
 
 
 SNYK_API_URL = 'https://snyk.io/api/v1/'
 TIMEOUT = 10
+DEFAULT_BRANCH = 'master'
+IMPORT_BATCH_SIZE = 100
+
+T = TypeVar('T')
+# GitHub (owner, repo, branch) to import.
+Target = Tuple[str, str, str]
+
+# Errors from reusing a keep-alive connection the server has since closed.
+STALE_CONNECTION_ERRORS = (
+    RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+)
+
+
+class RequestNotSentError(ConnectionError):
+    '''Connecting or sending failed, so the server never saw the request.'''
 
 
 class SnykError(Exception):
     pass
 
 
+class OrgNotFound(SnykError, KeyError):
+
+    def __str__(self) -> str:
+        return f'No Snyk org with name, id or slug {self.args[0]!r}'
+
+
+class SnykHTTPError(SnykError):
+
+    def __init__(self, status: int, headers: HTTPMessage, body: str):
+        super().__init__(f'HTTP {status}: {body}')
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class SnykRedirectError(SnykHTTPError):
+    '''The API answered with a redirect, which the clients do not follow.'''
+
+    def __str__(self) -> str:
+        return (
+            f'HTTP {self.status}: redirected to '
+            f'{self.headers.get("Location")}, which is not followed; check '
+            f'the Snyk API URL'
+        )
+
+
+class Response(NamedTuple):
+    status: int
+    headers: HTTPMessage
+    body: bytes
+    # Bytes read off the wire, which is less than len(body) when it arrived
+    # compressed.
+    wire_size: Optional[int] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.body) if self.wire_size is None else self.wire_size
+
+    @property
+    def ok(self) -> bool:
+        '''Not an error, nor a redirect. 304 answers a conditional GET.'''
+        return self.status < 300 or self.status == 304
+
+    def error(self) -> SnykHTTPError:
+        error_class = (
+            SnykRedirectError if 300 <= self.status < 400 else SnykHTTPError
+        )
+        return error_class(
+            self.status,
+            self.headers,
+            self.body.decode('utf-8', 'replace')[:200],
+        )
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def github_repo_name(name: str) -> str:
+    '''The repo in a GitHub project name such as `owner/repo:path/file`.'''
+    return name.split('/', 1)[1].split(':', 1)[0]
+
+
+def github_full_name(name: str) -> str:
+    '''The `owner/repo` in a GitHub project name such as `owner/repo:file`.'''
+    return name.split(':', 1)[0]
+
+
+def index_by_repo(projects: Iterable[Project]) -> Dict[str, List[Project]]:
+    '''
+    Group GitHub projects by the `owner/repo` they were imported from, so
+    repos of the same name under different owners are kept apart.
+    '''
+    index: Dict[str, List[Project]] = {}
+    for project in projects:
+        if project.repo_name is not None:
+            index.setdefault(
+                github_full_name(project.name), [],
+            ).append(project)
+    return index
+
+
 class HTTPClient:
 
     JSON_CONTENT_TYPE = 'application/json'
 
-    def __init__(self, url: str, token: str, timeout: float):
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        timeout: float,
+        rate_limiter: Optional[TokenBucket] = None,
+        pool: Optional[ConnectionPool] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        cache: Optional[ResponseCache] = None,
+        metrics: Optional[Metrics] = None,
+    ):
         self.url = url
         self.token = token
         self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.pool = pool if pool is not None else ConnectionPool(timeout)
+        self.retry_policy = (
+            retry_policy if retry_policy is not None else RetryPolicy()
+        )
+        self.cache = cache
+        self.metrics = metrics
+        self._inflight: SingleFlight[Tuple[str, bytes]] = SingleFlight()
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self._counters_lock = threading.Lock()
 
     @property
     def headers(self) -> Dict[str, str]:
         return {
             'Accept': self.JSON_CONTENT_TYPE,
+            'Accept-Encoding': ACCEPT_ENCODING,
             'Content-Type': self.JSON_CONTENT_TYPE,
             'Authorization': f'token {self.token}',
         }
 
-    def get_json(self, path: str) -> Dict[str, Any]:
+    def _throttle(self) -> None:
+        if self.rate_limiter is None:
+            return
+        try:
+            self.rate_limiter.acquire(
+                timeout=self.retry_policy.remaining(),
+            )
+        except RateLimitTimeout as e:
+            raise SnykError(f'{e}, the time left before the deadline') from e
+
+    def _send(
+        self,
+        method: str,
+        api_url: str,
+        body: Optional[bytes],
+        headers: Dict[str, str],
+    ) -> Response:
+        url = urlsplit(api_url)
+        target = url.path or '/'
+        if url.query:
+            target += f'?{url.query}'
+        while True:
+            conn, reused = self.pool.acquire(url.scheme, url.netloc)
+            sent = False
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                sent = True
+                response = conn.getresponse()
+                content, received = read_body(response)
+            except BaseException as e:
+                conn.close()
+                if reused and isinstance(e, STALE_CONNECTION_ERRORS):
+                    # The server closed the idle connection without
+                    # answering, so try again on a fresh one.
+                    continue
+                if isinstance(e, DecodingError):
+                    # Sending the request again would get the same body.
+                    raise SnykError(str(e)) from e
+                if not sent and isinstance(e, (OSError, HTTPException)):
+                    raise RequestNotSentError(str(e)) from e
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self.pool.release(url.scheme, url.netloc, conn)
+            with self._counters_lock:
+                self.bytes_received += received
+                self.bytes_decoded += len(content)
+            return Response(
+                response.status, response.headers, content, received,
+            )
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+        read_only: Optional[bool] = None,
+    ) -> Response:
         api_url = urljoin(self.url, path)
-        request = Request(api_url, headers=self.headers)
-        response = urlopen(request, timeout=self.timeout)
-        if 'application/json' not in response.getheader('Content-Type'):
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        headers = {**self.headers, **(headers or {})}
+        if read_only is None:
+            read_only = method == 'GET'
+        if not read_only:
+            self._invalidate(path)
+        idempotent = read_only or method in IDEMPOTENT_METHODS
+        policy = self.retry_policy
+        attempt = 0
+        waited = 0.0
+        while True:
+            self._throttle()
+            error: Exception
+            error_headers = None
+            metrics = self.metrics
+            started = metrics.clock() if metrics is not None else 0.0
+            try:
+                response = self._send(method, api_url, data, headers)
+            except (OSError, HTTPException) as e:
+                error = e
+                if metrics is not None:
+                    metrics.record_request(
+                        method, path, 'error', metrics.clock() - started,
+                        len(data or b''), 0, attempt > 0,
+                    )
+                if not (idempotent or isinstance(e, RequestNotSentError)):
+                    raise
+            else:
+                if metrics is not None:
+                    metrics.record_request(
+                        method, path, str(response.status),
+                        metrics.clock() - started,
+                        len(data or b''), response.size, attempt > 0,
+                        len(response.body),
+                    )
+                # A DELETE retried after a timeout may find the first
+                # attempt already went through.
+                gone = (
+                    method == 'DELETE' and response.status == 404 and
+                    attempt > 0
+                )
+                if response.ok or gone:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.recover()
+                    return response
+                error_headers = response.headers
+                error = response.error()
+                if not policy.retries_status(response.status, idempotent):
+                    raise error
+            delay = policy.delay(attempt, error_headers)
+            if not policy.allows(attempt, waited, delay):
+                raise error
+            attempt += 1
+            waited += delay
+            throttled = (
+                isinstance(error, SnykHTTPError) and error.status == 429
+            )
+            if throttled and self.rate_limiter is not None:
+                # Everyone sharing the limiter waits, including this request.
+                self.rate_limiter.throttle(delay)
+            else:
+                policy.sleep(delay)
+
+    def _invalidate(self, path: str) -> None:
+        '''
+        Drop cached responses a write to `path` may have changed, and stop
+        new readers joining GETs for them already in flight.
+        '''
+        parts = path.split('/')
+        if parts[0] == 'org' and len(parts) > 1:
+            prefix = f'org/{parts[1]}/'
+        elif parts[0] == 'group':
+            prefix = 'orgs'
+        else:
+            return
+        self._inflight.forget(prefix)
+        if self.cache is not None:
+            self.cache.invalidate(prefix)
+
+    def _get_cached(self, cache: ResponseCache, path: str) -> CacheEntry:
+        entry = cache.get(path)
+        if entry is not None and cache.is_fresh(path, entry):
+            return entry
+        headers = {}
+        if entry is not None and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        response = self.request('GET', path, headers=headers)
+        if response.status == 304 and entry is not None:
+            entry = entry._replace(stored=cache.clock())
+        else:
+            entry = CacheEntry(
+                cache.clock(),
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified'),
+                response.headers.get('Content-Type', ''),
+                response.body,
+            )
+        cache.put(path, entry)
+        return entry
+
+    def _get(self, path: str) -> Tuple[str, bytes]:
+        if self.cache is not None and self.cache.ttl(path) is not None:
+            entry = self._get_cached(self.cache, path)
+            return entry.content_type, entry.body
+        response = self.request('GET', path)
+        return response.headers.get('Content-Type', ''), response.body
+
+    def get_json(self, path: str) -> Dict[str, Any]:
+        '''
+        GET and decode `path`. Concurrent calls for the same path share one
+        request, and each gets its own decoded copy.
+        '''
+        content_type, body = self._inflight.do(path, lambda: self._get(path))
+        if 'application/json' not in content_type:
             raise SnykError('Response is not JSON')
-        data = json.load(response)
-        response.close()
-        return data
+        return json.loads(body)
 
     def post_json(self, path: str, body: Dict[str, Any]) -> Any:
-        api_url = urljoin(self.url, path)
-        request = Request(
-            api_url,
-            data=json.dumps(body).encode('utf-8'),
-            headers=self.headers,
-            method='POST',
-        )
-        response = urlopen(request, timeout=self.timeout)
-        data = json.load(response)
-        response.close()
-        return data
+        response = self.request('POST', path, body)
+        return json.loads(response.body) if response.body else None
+
+    def query_json(self, path: str, body: Dict[str, Any]) -> Any:
+        '''POST a read-only query, which leaves cached responses alone.'''
+        response = self.request('POST', path, body, read_only=True)
+        return json.loads(response.body)
 
     def delete(self, path: str) -> None:
-        api_url = urljoin(self.url, path)
-        request = Request(
-            api_url,
-            headers=self.headers,
-            method='DELETE',
-        )
-        response = urlopen(request, timeout=self.timeout)
-        response.close()
+        self.request('DELETE', path)
+
+    def close(self) -> None:
+        self.pool.close()
 
 
 class Group:
@@ -93,6 +396,9 @@ class Org:
 
     _integrations: Dict[str, Any]
     _projects: List[Project]
+    _projects_by_repo: Dict[str, List[Project]]
+
+    LAZY_ATTRS = ('_integrations', '_projects', '_projects_by_repo')
 
     def __init__(
         self,
@@ -100,75 +406,209 @@ class Org:
         name: str,
         id: str,
         group: Optional[Group],
+        slug: Optional[str] = None,
+        integrations: Optional[Dict[str, Any]] = None,
     ):
         self.client = client
         self.name = name
         self.id = id
         self.group = group
+        self.slug = slug
+        self._locks = {attr: threading.Lock() for attr in self.LAZY_ATTRS}
+        if integrations is not None:
+            self._integrations = integrations
+
+    def _lazy(self, attr: str, load: Callable[[], T]) -> T:
+        '''The value of `attr`, loaded once even when asked concurrently.'''
+        try:
+            return self.__dict__[attr]
+        except KeyError:
+            pass
+        with self._locks[attr]:
+            if attr not in self.__dict__:
+                self.__dict__[attr] = load()
+            return self.__dict__[attr]
 
     @property
     def integrations(self) -> Dict[str, Any]:
-        if not hasattr(self, '_integrations'):
-            self._integrations = self.client.get_json(
-                f'org/{self.id}/integrations',
-            )
-        return self._integrations
+        return self._lazy(
+            '_integrations',
+            lambda: self.client.get_json(f'org/{self.id}/integrations'),
+        )
 
-    def import_github_project(self, owner: str, name: str):
+    @property
+    def github_import_path(self) -> str:
         github_integration_id = self.integrations['github']
-        self.client.post_json(
-            f'org/{self.id}/integrations/{github_integration_id}/import',
-            {'target': {'owner': owner, 'name': name, 'branch': 'master'}}
+        return f'org/{self.id}/integrations/{github_integration_id}/import'
+
+    def _import_job(
+        self, body: Dict[str, Any], repos: List[str],
+    ) -> Optional[ImportJob]:
+        response = self.client.request('POST', self.github_import_path, body)
+        location = response.headers.get('Location')
+        if location is None:
+            return None
+        return ImportJob(self.client, location, repos)
+
+    def import_github_project(
+        self, owner: str, name: str,
+    ) -> Optional[ImportJob]:
+        return self._import_job(
+            {'target': {
+                'owner': owner, 'name': name, 'branch': DEFAULT_BRANCH,
+            }},
+            [name],
         )
 
+    def import_github_projects(
+        self, targets: Iterable[Target], batch_size: int = IMPORT_BATCH_SIZE,
+    ) -> List[ImportJob]:
+        '''
+        Import many repos, sending up to `batch_size` per request, and return
+        a job for each request to follow the imports with.
+        '''
+        jobs = []
+        for batch in batched(targets, batch_size):
+            job = self._import_job(
+                {'targets': [
+                    {'owner': owner, 'name': name, 'branch': branch}
+                    for owner, name, branch in batch
+                ]},
+                [name for _, name, _ in batch],
+            )
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    def refresh(self) -> None:
+        '''Forget cached integrations and projects so they are refetched.'''
+        for attr in self.LAZY_ATTRS:
+            self.__dict__.pop(attr, None)
+
     @property
     def projects(self) -> List[Project]:
-        if not hasattr(self, '_projects'):
-            data = self.client.get_json(f'org/{self.id}/projects')
-            self._projects = [
-                Project(self.client, datum, self)
-                for datum in data['projects']
-            ]
-        return self._projects
+        return self._lazy('_projects', lambda: list(self.iter_projects()))
+
+    def iter_projects(
+        self, origin: Optional[str] = None, type: Optional[str] = None,
+    ) -> Iterator[Project]:
+        '''
+        Yield the org's projects page by page, following the `next` link
+        when the API paginates. Filters on origin and type are applied by
+        the API, so unrelated projects are never downloaded, unless the
+        client caches project listings: then the unfiltered listing, which
+        a cached copy can be revalidated for instead of downloaded again,
+        is fetched and filtered here.
+        '''
+        filters = {
+            key: value
+            for key, value in (('origin', origin), ('type', type))
+            if value is not None
+        }
+        cache = self.client.cache
+        local = (
+            cache is not None
+            and cache.ttl(f'org/{self.id}/projects') is not None
+        )
+        path: Optional[str] = f'org/{self.id}/projects'
+        while path is not None:
+            if filters and not local:
+                data = self.client.query_json(path, {'filters': filters})
+            else:
+                data = self.client.get_json(path)
+            for datum in data['projects']:
+                if not local or all(
+                    datum.get(key) == value for key, value in filters.items()
+                ):
+                    yield Project(self.client, datum, self)
+            path = data.get('links', {}).get('next')
+
+    @property
+    def projects_by_repo(self) -> Dict[str, List[Project]]:
+        return self._lazy(
+            '_projects_by_repo', lambda: index_by_repo(self.projects),
+        )
 
 
 class Project:
+    '''
+    A project keeps only the fields the tool uses, so that listing a large
+    org does not hold every project's full API payload. The rest is fetched
+    on demand through `attrs`.
+    '''
 
-    origin: str
-    name: str
-    id: str
+    __slots__ = (
+        'client', 'org', 'id', 'name', 'origin', 'repo_name', '_attrs',
+    )
 
-    def __init__(self, client: HTTPClient, attrs: Dict, org: Org):
-        self.__dict__ = attrs
+    def __init__(
+        self,
+        client: HTTPClient,
+        attrs: Dict,
+        org: Org,
+        keep_attrs: bool = False,
+    ):
         self.client = client
         self.org = org
+        self.id: str = attrs['id']
+        self.name: str = attrs['name']
+        self.origin: str = attrs.get('origin', '')
+        self.repo_name: Optional[str] = (
+            github_repo_name(self.name) if self.origin == 'github' else None
+        )
+        self._attrs: Optional[Dict[str, Any]] = attrs if keep_attrs else None
+
+    @property
+    def attrs(self) -> Dict[str, Any]:
+        '''Every attribute of the project, fetched on first use.'''
+        if self._attrs is None:
+            self._attrs = self.client.get_json(
+                f'org/{self.org.id}/project/{self.id}',
+            )
+        return self._attrs
 
     def delete(self):
         path = f'org/{self.org.id}/project/{self.id}'
         self.client.delete(path)
 
-    @property
-    def repo_name(self) -> Optional[str]:
-        if self.origin != 'github':
-            return None
-        else:
-            return self.name.split('/', 1)[1].split(':', 1)[0]
-
 
 class Snyk:
 
     def __init__(
-        self, token: str, url: str = SNYK_API_URL, timeout: float = TIMEOUT,
+        self,
+        token: str,
+        url: str = SNYK_API_URL,
+        timeout: float = TIMEOUT,
+        rate_limiter: Optional[TokenBucket] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        cache: Optional[ResponseCache] = None,
+        pool: Optional[ConnectionPool] = None,
+        metrics: Optional[Metrics] = None,
     ):
         self.token = token
         self.url = url
         self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self._client = HTTPClient(
+            url,
+            token,
+            timeout,
+            rate_limiter,
+            pool=pool,
+            retry_policy=retry_policy,
+            cache=cache,
+            metrics=metrics,
+        )
+        # The orgs and their index by slug, id and name, replaced together
+        # so lock-free readers never see one without the other.
+        self._orgs: Optional[Tuple[List[Org], Dict[str, Org]]] = None
+        self._orgs_lock = threading.Lock()
 
     @property
     def client(self) -> HTTPClient:
-        return HTTPClient(self.url, self.token, self.timeout)
+        return self._client
 
-    def orgs(self) -> List[Org]:
+    def _load_orgs(self) -> List[Org]:
         data = self.client.get_json('orgs')
         orgs = []
         groups: Dict[str, Group] = {}
@@ -178,10 +618,43 @@ class Snyk:
             elif org['group']['id'] in groups:
                 group = groups[org['group']['id']]
             else:
-                group = Group(
+                group = groups[org['group']['id']] = Group(
                     self.client,
                     org['group']['name'],
                     org['group']['id'],
                 )
-            orgs.append(Org(self.client, org['name'], org['id'], group))
+            orgs.append(Org(
+                self.client, org['name'], org['id'], group, org.get('slug'),
+            ))
         return orgs
+
+    def _indexed_orgs(self) -> Tuple[List[Org], Dict[str, Org]]:
+        '''The orgs and their index, taking the lock only to load them.'''
+        loaded = self._orgs
+        if loaded is None:
+            with self._orgs_lock:
+                if self._orgs is None:
+                    orgs = self._load_orgs()
+                    index: Dict[str, Org] = {}
+                    for org in reversed(orgs):
+                        for key in (org.slug, org.id, org.name):
+                            if key:
+                                index[key] = org
+                    self._orgs = (orgs, index)
+                loaded = self._orgs
+        return loaded
+
+    def orgs(self) -> List[Org]:
+        '''All orgs the token can see, fetched once until `refresh_orgs`.'''
+        return list(self._indexed_orgs()[0])
+
+    def refresh_orgs(self) -> None:
+        with self._orgs_lock:
+            self._orgs = None
+
+    def org(self, key: str) -> Org:
+        '''Look up an org by name, id or slug.'''
+        try:
+            return self._indexed_orgs()[1][key]
+        except KeyError:
+            raise OrgNotFound(key) from None
@@ -0,0 +1,506 @@
+'''
+import asyncio
+from snyk.aio import AsyncSnyk
+
+async def main():
+    async with AsyncSnyk(os.environ['SNYK_TOKEN']) as snyk:
+        orgs = await snyk.orgs()
+        projects = await asyncio.gather(*(org.projects for org in orgs))
+'''
+from __future__ import annotations
+
+import asyncio
+import json
+import ssl
+from email.parser import BytesParser
+from http.client import HTTPMessage
+from urllib.parse import urljoin, urlsplit
+from typing import (
+    Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar,
+)
+
+from snyk import (
+    DEFAULT_BRANCH, SNYK_API_URL, TIMEOUT, RequestNotSentError, Response,
+    SnykError, SnykHTTPError, github_repo_name,
+)
+from snyk.encoding import CHUNK_SIZE
+from snyk.proxy import proxy_for, tunnel
+from snyk.ratelimit import RateLimitTimeout, TokenBucket
+from snyk.retry import IDEMPOTENT_METHODS, RetryPolicy
+
+
+MAX_CONCURRENCY = 100
+
+T = TypeVar('T')
+Key = Tuple[str, str]
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+# Errors from a connection that was dropped or timed out mid-request.
+CONNECTION_ERRORS = (
+    OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+)
+# Errors from reusing a keep-alive connection the server has since closed.
+STALE_CONNECTION_ERRORS = (ConnectionError, asyncio.IncompleteReadError)
+
+
+class TimedReader:
+    '''
+    Reads from a stream with `timeout` applied to each read, as a socket
+    timeout is for HTTPClient, so a large body that keeps arriving is not
+    cut off however long it takes in all.
+    '''
+
+    def __init__(self, reader: asyncio.StreamReader, timeout: float):
+        self.reader = reader
+        self.timeout = timeout
+
+    async def readline(self) -> bytes:
+        return await asyncio.wait_for(self.reader.readline(), self.timeout)
+
+    async def _read_chunk(self, n: int = CHUNK_SIZE) -> bytes:
+        return await asyncio.wait_for(self.reader.read(n), self.timeout)
+
+    async def readexactly(self, n: int) -> bytes:
+        chunks: List[bytes] = []
+        left = n
+        while left > 0:
+            chunk = await self._read_chunk(min(left, CHUNK_SIZE))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b''.join(chunks), n)
+            chunks.append(chunk)
+            left -= len(chunk)
+        return b''.join(chunks)
+
+    async def read(self) -> bytes:
+        '''Read until the server closes the stream.'''
+        chunks: List[bytes] = []
+        while True:
+            chunk = await self._read_chunk()
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+
+async def _read_body(
+    reader: TimedReader, headers: HTTPMessage,
+) -> Tuple[bytes, bool]:
+    '''Read a response body, returning it and whether the stream is done.'''
+    if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+        chunks: List[bytes] = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # Skip any trailers up to the blank line ending the message.
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks), False
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+    length = headers.get('Content-Length')
+    if length is not None:
+        return await reader.readexactly(int(length)), False
+    return await reader.read(), True
+
+
+class AsyncHTTPClient:
+    '''
+    Non-blocking counterpart of HTTPClient, speaking HTTP/1.1 over asyncio
+    streams. At most `max_concurrency` requests are in flight at once, each
+    on a keep-alive connection taken from a per-host pool.
+    '''
+
+    JSON_CONTENT_TYPE = 'application/json'
+
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        timeout: float,
+        max_concurrency: int = MAX_CONCURRENCY,
+        rate_limiter: Optional[TokenBucket] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        self.retry_policy = (
+            retry_policy if retry_policy is not None else RetryPolicy()
+        )
+        self.connections_created = 0
+        self.connections_reused = 0
+        self._idle: Dict[Key, List[Connection]] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            'Accept': self.JSON_CONTENT_TYPE,
+            'Content-Type': self.JSON_CONTENT_TYPE,
+            'Authorization': f'token {self.token}',
+        }
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so that it binds to the running event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _connect(self, scheme: str, netloc: str) -> Connection:
+        url = urlsplit(f'{scheme}://{netloc}')
+        if scheme == 'https':
+            context: Optional[ssl.SSLContext] = ssl.create_default_context()
+            port = url.port or 443
+        elif scheme == 'http':
+            context = None
+            port = url.port or 80
+        else:
+            raise ValueError(f'Unsupported URL scheme: {scheme}')
+        host = url.hostname or netloc
+        proxy = proxy_for(scheme, netloc)
+        if proxy is None:
+            return await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=context),
+                self.timeout,
+            )
+        # The CONNECT handshake is short, so it is done with a blocking
+        # socket off the event loop, which then takes the socket over.
+        sock = await asyncio.wait_for(
+            asyncio.get_running_loop().run_in_executor(
+                None, tunnel, proxy, host, port, self.timeout,
+            ),
+            self.timeout,
+        )
+        return await asyncio.wait_for(
+            asyncio.open_connection(
+                sock=sock,
+                ssl=context,
+                server_hostname=host if context is not None else None,
+            ),
+            self.timeout,
+        )
+
+    async def _acquire(self, key: Key) -> Tuple[Connection, bool]:
+        idle = self._idle.get(key)
+        while idle:
+            conn = idle.pop()
+            if not conn[1].is_closing():
+                self.connections_reused += 1
+                return conn, True
+        self.connections_created += 1
+        return await self._connect(*key), False
+
+    def _release(self, key: Key, conn: Connection) -> None:
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.max_concurrency:
+            idle.append(conn)
+        else:
+            conn[1].close()
+
+    async def _exchange(
+        self, conn: Connection, method: str, target: str, host: str,
+        body: Optional[bytes],
+    ) -> Tuple[Response, bool]:
+        reader, writer = TimedReader(conn[0], self.timeout), conn[1]
+        headers = {**self.headers, 'Host': host}
+        headers['Content-Length'] = str(len(body or b''))
+        head = f'{method} {target} HTTP/1.1\r\n' + ''.join(
+            f'{name}: {value}\r\n' for name, value in headers.items()
+        ) + '\r\n'
+        writer.write(head.encode('latin-1') + (body or b''))
+        await asyncio.wait_for(writer.drain(), self.timeout)
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Server closed the connection')
+        status = int(status_line.split()[1])
+        lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            lines.append(line)
+        message = BytesParser(_class=HTTPMessage).parsebytes(b''.join(lines))
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            content, done = b'', False
+        else:
+            content, done = await _read_body(reader, message)
+        keep_alive = (
+            not done and
+            message.get('Connection', '').lower() != 'close'
+        )
+        return Response(status, message, content), keep_alive
+
+    async def _send(
+        self, method: str, api_url: str, body: Optional[bytes],
+    ) -> Response:
+        url = urlsplit(api_url)
+        key = (url.scheme, url.netloc)
+        target = url.path or '/'
+        if url.query:
+            target += f'?{url.query}'
+        while True:
+            try:
+                conn, reused = await self._acquire(key)
+            except CONNECTION_ERRORS as e:
+                raise RequestNotSentError(str(e)) from e
+            try:
+                response, keep_alive = await self._exchange(
+                    conn, method, target, url.netloc, body,
+                )
+            except STALE_CONNECTION_ERRORS:
+                conn[1].close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                conn[1].close()
+                raise
+            if keep_alive:
+                self._release(key, conn)
+            else:
+                conn[1].close()
+            return response
+
+    async def _throttle(self) -> None:
+        if self.rate_limiter is None:
+            return
+        try:
+            delay = self.rate_limiter.reserve(
+                timeout=self.retry_policy.remaining(),
+            )
+        except RateLimitTimeout as e:
+            raise SnykError(f'{e}, the time left before the deadline') from e
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def request(
+        self, method: str, path: str, body: Optional[Any] = None,
+    ) -> Response:
+        api_url = urljoin(self.url, path)
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        idempotent = method in IDEMPOTENT_METHODS
+        policy = self.retry_policy
+        attempt = 0
+        waited = 0.0
+        while True:
+            await self._throttle()
+            error: Exception
+            headers = None
+            try:
+                async with self.semaphore:
+                    response = await self._send(method, api_url, data)
+            except CONNECTION_ERRORS as e:
+                error = e
+                if not (idempotent or isinstance(e, RequestNotSentError)):
+                    raise
+            else:
+                gone = (
+                    method == 'DELETE' and response.status == 404 and
+                    attempt > 0
+                )
+                if response.ok or gone:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.recover()
+                    return response
+                headers = response.headers
+                error = response.error()
+                if not policy.retries_status(response.status, idempotent):
+                    raise error
+            delay = policy.delay(attempt, headers)
+            if not policy.allows(attempt, waited, delay):
+                raise error
+            attempt += 1
+            waited += delay
+            throttled = (
+                isinstance(error, SnykHTTPError) and error.status == 429
+            )
+            if throttled and self.rate_limiter is not None:
+                self.rate_limiter.throttle(delay)
+            else:
+                await asyncio.sleep(delay)
+
+    async def get_json(self, path: str) -> Dict[str, Any]:
+        response = await self.request('GET', path)
+        content_type = response.headers.get('Content-Type', '')
+        if 'application/json' not in content_type:
+            raise SnykError('Response is not JSON')
+        return json.loads(response.body)
+
+    async def post_json(self, path: str, body: Dict[str, Any]) -> Any:
+        response = await self.request('POST', path, body)
+        return json.loads(response.body) if response.body else None
+
+    async def delete(self, path: str) -> None:
+        await self.request('DELETE', path)
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for _, writer in conns:
+                writer.close()
+
+
+def _memoize(
+    obj: Any, attr: str, load: Callable[[], Awaitable[T]],
+) -> Awaitable[T]:
+    '''
+    Share one load of a lazy attribute between every awaiter, so concurrent
+    callers make a single request. A failed or cancelled load is forgotten
+    and retried.
+    '''
+    task = getattr(obj, attr, None)
+    if task is None or task.done() and (
+        task.cancelled() or task.exception() is not None
+    ):
+        task = asyncio.ensure_future(load())
+        setattr(obj, attr, task)
+    # Shielded, so that a caller giving up on its wait does not cancel the
+    # load for everyone else.
+    return asyncio.shield(task)
+
+
+class AsyncGroup:
+
+    def __init__(self, client: AsyncHTTPClient, name: str, id: str):
+        self.client = client
+        self.name = name
+        self.id = id
+
+    async def create_org(
+        self, name: str, source_org: Optional[AsyncOrg] = None,
+    ) -> AsyncOrg:
+        body = {'name': name}
+        if source_org:
+            body['sourceOrgId'] = source_org.id
+        data = await self.client.post_json(f'group/{self.id}/org', body)
+        return AsyncOrg(self.client, data['name'], data['id'], self)
+
+
+class AsyncOrg:
+
+    def __init__(
+        self,
+        client: AsyncHTTPClient,
+        name: str,
+        id: str,
+        group: Optional[AsyncGroup],
+        slug: Optional[str] = None,
+    ):
+        self.client = client
+        self.name = name
+        self.id = id
+        self.group = group
+        self.slug = slug
+
+    @property
+    def integrations(self) -> Awaitable[Dict[str, Any]]:
+        return _memoize(self, '_integrations', lambda: self.client.get_json(
+            f'org/{self.id}/integrations',
+        ))
+
+    async def import_github_project(self, owner: str, name: str) -> None:
+        github_integration_id = (await self.integrations)['github']
+        await self.client.post_json(
+            f'org/{self.id}/integrations/{github_integration_id}/import',
+            {'target': {
+                'owner': owner, 'name': name, 'branch': DEFAULT_BRANCH,
+            }},
+        )
+
+    async def _load_projects(self) -> List[AsyncProject]:
+        data = await self.client.get_json(f'org/{self.id}/projects')
+        return [AsyncProject(self.client, datum, self)
+                for datum in data['projects']]
+
+    @property
+    def projects(self) -> Awaitable[List[AsyncProject]]:
+        return _memoize(self, '_projects', self._load_projects)
+
+
+class AsyncProject:
+
+    __slots__ = (
+        'client', 'org', 'id', 'name', 'origin', 'repo_name', '_attrs',
+    )
+
+    def __init__(
+        self,
+        client: AsyncHTTPClient,
+        attrs: Dict,
+        org: AsyncOrg,
+        keep_attrs: bool = False,
+    ):
+        self.client = client
+        self.org = org
+        self.id: str = attrs['id']
+        self.name: str = attrs['name']
+        self.origin: str = attrs.get('origin', '')
+        self.repo_name: Optional[str] = (
+            github_repo_name(self.name) if self.origin == 'github' else None
+        )
+        self._attrs: Optional[Dict[str, Any]] = attrs if keep_attrs else None
+
+    async def load_attrs(self) -> Dict[str, Any]:
+        '''Every attribute of the project, fetched on first use.'''
+        if self._attrs is None:
+            self._attrs = await self.client.get_json(
+                f'org/{self.org.id}/project/{self.id}',
+            )
+        return self._attrs
+
+    async def delete(self) -> None:
+        await self.client.delete(f'org/{self.org.id}/project/{self.id}')
+
+
+class AsyncSnyk:
+
+    def __init__(
+        self,
+        token: str,
+        url: str = SNYK_API_URL,
+        timeout: float = TIMEOUT,
+        max_concurrency: int = MAX_CONCURRENCY,
+        rate_limiter: Optional[TokenBucket] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        self.token = token
+        self.url = url
+        self.timeout = timeout
+        self._client = AsyncHTTPClient(
+            url, token, timeout, max_concurrency, rate_limiter, retry_policy,
+        )
+
+    @property
+    def client(self) -> AsyncHTTPClient:
+        return self._client
+
+    async def orgs(self) -> List[AsyncOrg]:
+        data = await self.client.get_json('orgs')
+        orgs = []
+        groups: Dict[str, AsyncGroup] = {}
+        for org in data.get('orgs', []):
+            if not org['group']:
+                group = None
+            elif org['group']['id'] in groups:
+                group = groups[org['group']['id']]
+            else:
+                group = groups[org['group']['id']] = AsyncGroup(
+                    self.client,
+                    org['group']['name'],
+                    org['group']['id'],
+                )
+            orgs.append(AsyncOrg(
+                self.client, org['name'], org['id'], group, org.get('slug'),
+            ))
+        return orgs
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def __aenter__(self) -> AsyncSnyk:
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
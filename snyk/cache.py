@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+from fnmatch import fnmatch
+from typing import Callable, Dict, NamedTuple, Optional
+from urllib.parse import quote, unquote
+
+
+# Seconds a cached response is used without revalidating, by path pattern,
+# matched without the query string so every page of a listing is covered.
+# Paths matching no pattern are not cached. Only GETs are cached, so while
+# `org/*/projects` is covered, Org.iter_projects lists projects with a GET
+# and filters them itself instead of sending a filtered POST query.
+DEFAULT_TTLS = {
+    'orgs': 600.0,
+    'org/*/integrations': 86400.0,
+    'org/*/projects': 0.0,
+}
+MAX_BYTES = 256 * 1024 * 1024
+SUFFIX = '.cache'
+
+
+class CacheEntry(NamedTuple):
+    stored: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_type: str
+    body: bytes
+
+
+class ResponseCache:
+    '''
+    On-disk cache of GET responses, one file per path. Entries are served
+    as-is for their path's TTL and revalidated with If-None-Match and
+    If-Modified-Since after that. Once the files take up more than
+    `max_bytes`, the least recently used are evicted.
+    '''
+
+    def __init__(
+        self,
+        directory: str,
+        ttls: Optional[Dict[str, float]] = None,
+        max_bytes: int = MAX_BYTES,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.directory = directory
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _file(self, path: str) -> str:
+        return os.path.join(self.directory, quote(path, safe='') + SUFFIX)
+
+    def ttl(self, path: str) -> Optional[float]:
+        path = path.split('?', 1)[0]
+        matches = [
+            pattern for pattern in self.ttls if fnmatch(path, pattern)
+        ]
+        if not matches:
+            return None
+        return self.ttls[max(matches, key=len)]
+
+    def get(self, path: str) -> Optional[CacheEntry]:
+        filename = self._file(path)
+        try:
+            with open(filename, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+            # The file's mtime records when it was last used, for eviction.
+            os.utime(filename)
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(
+            meta['stored'],
+            meta.get('etag'),
+            meta.get('last_modified'),
+            meta.get('content_type', ''),
+            body,
+        )
+
+    def is_fresh(self, path: str, entry: CacheEntry) -> bool:
+        ttl = self.ttl(path)
+        return ttl is not None and self.clock() - entry.stored < ttl
+
+    def put(self, path: str, entry: CacheEntry) -> None:
+        meta = json.dumps({
+            'stored': entry.stored,
+            'etag': entry.etag,
+            'last_modified': entry.last_modified,
+            'content_type': entry.content_type,
+        }).encode('utf-8')
+        filename = self._file(path)
+        tmp = f'{filename}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(meta + b'\n' + entry.body)
+        os.replace(tmp, filename)
+        self._evict()
+
+    def invalidate(self, prefix: str) -> None:
+        '''Drop every entry whose path starts with `prefix`.'''
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if (
+                    name.endswith(SUFFIX) and
+                    unquote(name[:-len(SUFFIX)]).startswith(prefix)
+                ):
+                    self._remove(os.path.join(self.directory, name))
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                filename = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, filename))
+            total = sum(size for _, size, _ in entries)
+            for _, size, filename in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(filename)
+                total -= size
+
+    @staticmethod
+    def _remove(filename: str) -> None:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
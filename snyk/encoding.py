@@ -0,0 +1,68 @@
+import zlib
+from http.client import HTTPResponse
+from typing import List, Optional, Tuple
+
+
+ACCEPT_ENCODING = 'gzip, deflate'
+# Bytes read off the socket, and decompressed, at a time.
+CHUNK_SIZE = 64 * 1024
+
+
+class DecodingError(ValueError):
+    '''A body in an unsupported Content-Encoding, or not valid in its own.'''
+
+
+class Decoder:
+    '''
+    Decompresses a gzip or deflate body a chunk at a time. "deflate" is
+    meant to be zlib-wrapped, but some servers send raw deflate data, so
+    the format is told apart from the first bytes.
+    '''
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self._zlib: Optional['zlib._Decompress'] = None
+        if encoding in ('gzip', 'x-gzip'):
+            self._zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding != 'deflate':
+            raise DecodingError(f'Unsupported Content-Encoding: {encoding}')
+
+    def decompress(self, chunk: bytes) -> bytes:
+        if self._zlib is None:
+            wrapped = (
+                len(chunk) >= 2 and chunk[0] & 0x0F == 8 and
+                (chunk[0] << 8 | chunk[1]) % 31 == 0
+            )
+            self._zlib = zlib.decompressobj(
+                zlib.MAX_WBITS if wrapped else -zlib.MAX_WBITS,
+            )
+        try:
+            return self._zlib.decompress(chunk)
+        except zlib.error as e:
+            raise DecodingError(f'Bad {self.encoding} body: {e}') from e
+
+    def flush(self) -> bytes:
+        return self._zlib.flush() if self._zlib is not None else b''
+
+
+def read_body(response: HTTPResponse) -> Tuple[bytes, int]:
+    '''
+    Read the body of `response`, decompressing it as it arrives if it was
+    sent with a Content-Encoding, and return it with the number of bytes
+    read off the wire.
+    '''
+    encoding = (response.getheader('Content-Encoding') or '').strip().lower()
+    if encoding in ('', 'identity'):
+        body = response.read()
+        return body, len(body)
+    decoder = Decoder(encoding)
+    chunks: List[bytes] = []
+    received = 0
+    while True:
+        chunk = response.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        received += len(chunk)
+        chunks.append(decoder.decompress(chunk))
+    chunks.append(decoder.flush())
+    return b''.join(chunks), received
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple
+
+if TYPE_CHECKING:
+    from snyk import HTTPClient
+
+
+POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 30.0
+POLL_TIMEOUT = 600.0
+POLL_WORKERS = 8
+
+PENDING = 'pending'
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+
+class ImportResult(NamedTuple):
+    repo: str
+    success: bool
+    status: str
+    duration: float
+
+
+class ImportJob:
+    '''
+    An import started by Org.import_github_project(s), polled through the
+    URL the API returned in the Location header.
+    '''
+
+    def __init__(
+        self,
+        client: HTTPClient,
+        url: str,
+        repos: List[str],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.client = client
+        self.url = url
+        self.repos = repos
+        self.clock = clock
+        self.started = clock()
+        self.status = PENDING
+        self.finished: Dict[str, float] = {}
+        self.statuses: Dict[str, str] = {}
+
+    @property
+    def done(self) -> bool:
+        return self.status != PENDING
+
+    def poll(self) -> None:
+        data = self.client.get_json(self.url)
+        now = self.clock()
+        for log in data.get('logs', []):
+            repo = log.get('name', '').split('/', 1)[-1].split(':', 1)[0]
+            status = log.get('status', PENDING)
+            if status != PENDING and repo not in self.finished:
+                self.finished[repo] = now
+            self.statuses[repo] = status
+        self.status = data.get('status', PENDING)
+        if self.done:
+            for repo in self.repos:
+                self.finished.setdefault(repo, now)
+
+    def fail(self, error: Exception) -> None:
+        '''Give up on the job, failing every repo it had not finished.'''
+        now = self.clock()
+        self.status = f'{FAILED} ({error})'
+        for repo in self.repos:
+            if self.statuses.get(repo, PENDING) == PENDING:
+                self.statuses[repo] = self.status
+            self.finished.setdefault(repo, now)
+
+    def poll_or_fail(self) -> None:
+        '''Poll the job, failing it if it can no longer be polled.'''
+        try:
+            self.poll()
+        except Exception as e:
+            self.fail(e)
+
+    def results(self) -> List[ImportResult]:
+        now = self.clock()
+        results = []
+        for repo in self.repos:
+            status = self.statuses.get(repo, self.status)
+            results.append(ImportResult(
+                repo,
+                status == COMPLETE,
+                status,
+                self.finished.get(repo, now) - self.started,
+            ))
+        return results
+
+
+def wait_for_imports(
+    jobs: List[ImportJob],
+    timeout: float = POLL_TIMEOUT,
+    interval: float = POLL_INTERVAL,
+    max_interval: float = MAX_POLL_INTERVAL,
+    workers: int = POLL_WORKERS,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep,
+) -> List[ImportResult]:
+    '''
+    Poll the jobs concurrently until they all finish or `timeout` passes,
+    backing off between rounds, and return how each repo fared. Repos whose
+    job is still running at the deadline are reported as pending, and those
+    whose job could not be polled, e.g. because it expired, as failed.
+    '''
+    deadline = clock() + timeout
+    pending = [job for job in jobs if not job.done]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending:
+            for _ in executor.map(ImportJob.poll_or_fail, pending):
+                pass
+            pending = [job for job in pending if not job.done]
+            if not pending or clock() >= deadline:
+                break
+            sleep(min(interval, max(0.0, deadline - clock())))
+            interval = min(max_interval, interval * 2)
+    return [result for job in jobs for result in job.results()]
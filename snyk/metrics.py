@@ -0,0 +1,252 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = 'snyk_access'
+
+# Path segments that are followed by an id, e.g. `org/{id}/projects`.
+ID_AFTER = {'org', 'group', 'project', 'integrations', 'import'}
+
+
+def endpoint_template(path: str) -> str:
+    '''The path with its ids replaced, to group requests by endpoint.'''
+    path = urlsplit(path).path
+    if '/api/v1/' in path:
+        path = path.split('/api/v1/', 1)[1]
+    segments = path.strip('/').split('/')
+    return '/'.join(
+        '{id}' if i and segments[i - 1] in ID_AFTER else segment
+        for i, segment in enumerate(segments)
+    )
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    '''Nearest-rank percentile of an already sorted list.'''
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class EndpointStats:
+
+    def __init__(self) -> None:
+        self.statuses: Counter = Counter()
+        self.latencies: List[float] = []
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self.retries = 0
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        return {
+            'requests': len(ordered),
+            'statuses': dict(self.statuses),
+            'retries': self.retries,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'bytes_decoded': self.bytes_decoded,
+            'seconds': sum(ordered),
+            **{
+                f'p{round(q * 100)}': percentile(ordered, q)
+                for q in QUANTILES
+            },
+        }
+
+
+class Metrics:
+    '''
+    Thread-safe record of every HTTP request, grouped by method and
+    endpoint template, and of how long each phase of a run took.
+
+    metrics = Metrics()
+    with metrics.phase('imports'):
+        ...
+    metrics.write('metrics.prom')
+    '''
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.endpoints: Dict[Tuple[str, str], EndpointStats] = {}
+        self.phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record_request(
+        self,
+        method: str,
+        path: str,
+        status: str,
+        seconds: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+        retry: bool = False,
+        bytes_decoded: Optional[int] = None,
+    ) -> None:
+        '''
+        Record one attempt. `bytes_received` counts what came over the wire
+        and `bytes_decoded` the body once decompressed, if it differs.
+        '''
+        key = (method, endpoint_template(path))
+        with self._lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats()
+            stats.statuses[status] += 1
+            stats.latencies.append(seconds)
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.bytes_decoded += (
+                bytes_received if bytes_decoded is None else bytes_decoded
+            )
+            stats.retries += retry
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        '''Time a phase. Phases run more than once add up.'''
+        started = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - started
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'endpoints': [
+                    {'method': method, 'endpoint': endpoint, **stats.summary()}
+                    for (method, endpoint), stats in sorted(
+                        self.endpoints.items(),
+                    )
+                ],
+                'phases': dict(self.phases),
+            }
+
+    def prometheus(self) -> str:
+        '''The metrics in the Prometheus text exposition format.'''
+        summary = self.summary()
+        lines = [
+            f'# HELP {PREFIX}_request_duration_seconds '
+            f'Snyk API request latency.',
+            f'# TYPE {PREFIX}_request_duration_seconds summary',
+        ]
+        for endpoint in summary['endpoints']:
+            labels = _labels(
+                method=endpoint['method'], endpoint=endpoint['endpoint'],
+            )
+            for q in QUANTILES:
+                quantile = _labels(
+                    method=endpoint['method'],
+                    endpoint=endpoint['endpoint'],
+                    quantile=str(q),
+                )
+                lines.append(
+                    f'{PREFIX}_request_duration_seconds{quantile} '
+                    f'{endpoint[f"p{round(q * 100)}"]}'
+                )
+            lines.append(
+                f'{PREFIX}_request_duration_seconds_sum{labels} '
+                f'{endpoint["seconds"]}'
+            )
+            lines.append(
+                f'{PREFIX}_request_duration_seconds_count{labels} '
+                f'{endpoint["requests"]}'
+            )
+        lines += [
+            f'# HELP {PREFIX}_requests_total Snyk API requests by status.',
+            f'# TYPE {PREFIX}_requests_total counter',
+        ]
+        for endpoint in summary['endpoints']:
+            for status, count in sorted(endpoint['statuses'].items()):
+                labels = _labels(
+                    method=endpoint['method'],
+                    endpoint=endpoint['endpoint'],
+                    status=status,
+                )
+                lines.append(f'{PREFIX}_requests_total{labels} {count}')
+        lines += [
+            f'# HELP {PREFIX}_request_retries_total Snyk API retries.',
+            f'# TYPE {PREFIX}_request_retries_total counter',
+        ]
+        for endpoint in summary['endpoints']:
+            labels = _labels(
+                method=endpoint['method'], endpoint=endpoint['endpoint'],
+            )
+            lines.append(
+                f'{PREFIX}_request_retries_total{labels} '
+                f'{endpoint["retries"]}'
+            )
+        lines += [
+            f'# HELP {PREFIX}_request_bytes_total Snyk API bytes sent '
+            f'and received.',
+            f'# TYPE {PREFIX}_request_bytes_total counter',
+        ]
+        for endpoint in summary['endpoints']:
+            for direction in ('sent', 'received'):
+                labels = _labels(
+                    method=endpoint['method'],
+                    endpoint=endpoint['endpoint'],
+                    direction=direction,
+                )
+                lines.append(
+                    f'{PREFIX}_request_bytes_total{labels} '
+                    f'{endpoint[f"bytes_{direction}"]}'
+                )
+        lines += [
+            f'# HELP {PREFIX}_response_decoded_bytes_total Snyk API response '
+            f'bytes after decompression.',
+            f'# TYPE {PREFIX}_response_decoded_bytes_total counter',
+        ]
+        for endpoint in summary['endpoints']:
+            labels = _labels(
+                method=endpoint['method'], endpoint=endpoint['endpoint'],
+            )
+            lines.append(
+                f'{PREFIX}_response_decoded_bytes_total{labels} '
+                f'{endpoint["bytes_decoded"]}'
+            )
+        lines += [
+            f'# HELP {PREFIX}_phase_duration_seconds Time spent in each '
+            f'phase of the run.',
+            f'# TYPE {PREFIX}_phase_duration_seconds gauge',
+        ]
+        for name, seconds in sorted(summary['phases'].items()):
+            lines.append(
+                f'{PREFIX}_phase_duration_seconds{_labels(phase=name)} '
+                f'{seconds}'
+            )
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filename: str) -> None:
+        '''
+        Write a Prometheus textfile if `filename` ends in `.prom`, a JSON
+        summary otherwise. The file is replaced atomically, so a collector
+        never reads it half written.
+        '''
+        if filename.endswith('.prom'):
+            content = self.prometheus()
+        else:
+            content = json.dumps(self.summary(), indent=2) + '\n'
+        tmp = f'{filename}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(content)
+        os.replace(tmp, filename)
+
+
+def _labels(**labels: str) -> str:
+    escaped = (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        for value in labels.values()
+    )
+    return '{' + ','.join(
+        f'{name}="{value}"' for name, value in zip(labels, escaped)
+    ) + '}'
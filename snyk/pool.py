@@ -0,0 +1,66 @@
+import threading
+from http.client import HTTPConnection, HTTPSConnection
+from typing import Dict, List, Tuple, Type
+
+from snyk.proxy import proxy_for
+
+
+Key = Tuple[str, str]
+
+
+class ConnectionPool:
+    '''
+    Thread-safe pool of persistent HTTP(S) connections, keyed by scheme and
+    host. A connection is used by one thread at a time: take it with
+    `acquire` and hand it back with `release` once the response is read.
+    Connections tunnel through the proxy HTTP(S)_PROXY names, unless
+    NO_PROXY excludes the host.
+    '''
+
+    def __init__(self, timeout: float, maxsize: int = 10):
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.created = 0
+        self.reused = 0
+        self._idle: Dict[Key, List[HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, scheme: str, netloc: str) -> Tuple[HTTPConnection, bool]:
+        '''Return a connection to the host and whether it was reused.'''
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                self.reused += 1
+                return idle.pop(), True
+            self.created += 1
+        return self._connect(scheme, netloc), False
+
+    def release(self, scheme: str, netloc: str, conn: HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _connect(self, scheme: str, netloc: str) -> HTTPConnection:
+        connection_class: Type[HTTPConnection]
+        if scheme == 'https':
+            connection_class = HTTPSConnection
+        elif scheme == 'http':
+            connection_class = HTTPConnection
+        else:
+            raise ValueError(f'Unsupported URL scheme: {scheme}')
+        proxy = proxy_for(scheme, netloc)
+        if proxy is None:
+            return connection_class(netloc, timeout=self.timeout)
+        conn = connection_class(proxy.host, proxy.port, timeout=self.timeout)
+        conn.set_tunnel(netloc, headers=proxy.headers)
+        return conn
@@ -0,0 +1,139 @@
+import cProfile
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple, TypeVar
+
+
+T = TypeVar('T')
+
+TOP_ALLOCATIONS = 25
+# Reports group allocations by line, and deeper tracebacks slow runs a lot.
+TRACEMALLOC_FRAMES = 1
+# Leave the profiling machinery's own allocations out of the reports.
+IGNORED_FILES = (
+    tracemalloc.__file__, pstats.__file__, cProfile.__file__, __file__,
+)
+
+
+class Profiler:
+    '''
+    Profiles each phase of a run with cProfile and, with `memory`, records
+    the allocations made during it with tracemalloc. Phases that run more
+    than once are merged. Call `close` to write `<phase>.pstats` files, and
+    `<phase>.alloc.txt` reports of the top allocation sites, to `directory`.
+
+    cProfile only sees the thread that enabled it, so work handed to other
+    threads should go through `wrap` to count towards the phase.
+    '''
+
+    def __init__(
+        self,
+        directory: str,
+        memory: bool = False,
+        top: int = TOP_ALLOCATIONS,
+    ):
+        self.directory = directory
+        self.memory = memory
+        self.top = top
+        self._profiles: List[Tuple[str, cProfile.Profile]] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(directory, exist_ok=True)
+        self._tracing = memory and not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    @property
+    def _phases(self) -> List[str]:
+        if not hasattr(self._local, 'phases'):
+            self._local.phases = []
+        return self._local.phases
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        before = _snapshot() if self.memory else None
+        self._phases.append(name)
+        try:
+            with self._profiling(name):
+                yield
+        finally:
+            self._phases.pop()
+            if before is not None:
+                self._write_allocations(name, before)
+
+    def wrap(self, func: Callable[..., T]) -> Callable[..., T]:
+        '''
+        Have calls to `func`, from any thread, count towards the phase the
+        calling thread is in now.
+        '''
+        if not self._phases:
+            return func
+        name = self._phases[-1]
+
+        def profiled(*args: Any, **kwargs: Any) -> T:
+            with self._profiling(name):
+                return func(*args, **kwargs)
+
+        return profiled
+
+    @contextmanager
+    def _profiling(self, name: str) -> Iterator[None]:
+        # One profile per thread and phase, resumed on each call and only
+        # turned into stats on close, keeps wrapped calls cheap.
+        profiles = self._local.__dict__.setdefault('profiles', {})
+        profile = profiles.get(name)
+        if profile is None:
+            profile = profiles[name] = cProfile.Profile()
+            with self._lock:
+                self._profiles.append((name, profile))
+        try:
+            profile.enable()
+            enabled = True
+        except ValueError:
+            # Another profiler is already active.
+            enabled = False
+        try:
+            yield
+        finally:
+            if enabled:
+                profile.disable()
+
+    def _write_allocations(
+        self, name: str, before: tracemalloc.Snapshot,
+    ) -> None:
+        after = _snapshot()
+        diff = after.compare_to(before, 'lineno')
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f'# {name}: {sum(d.size_diff for d in diff) / 2**20:+.1f} MiB, '
+            f'{current / 2**20:.1f} MiB traced, '
+            f'{peak / 2**20:.1f} MiB peak so far',
+        ] + [str(d) for d in diff[:self.top]]
+        with self._lock:
+            filename = os.path.join(self.directory, f'{name}.alloc.txt')
+            with open(filename, 'a') as f:
+                f.write('\n'.join(lines) + '\n\n')
+
+    def close(self) -> None:
+        stats: Dict[str, pstats.Stats] = {}
+        with self._lock:
+            for name, profile in self._profiles:
+                if name in stats:
+                    stats[name].add(profile)
+                else:
+                    stats[name] = pstats.Stats(profile)
+        for name, phase_stats in stats.items():
+            phase_stats.dump_stats(
+                os.path.join(self.directory, f'{name}.pstats'),
+            )
+        if self._tracing:
+            tracemalloc.stop()
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, filename) for filename in IGNORED_FILES
+    ])
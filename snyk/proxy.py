@@ -0,0 +1,63 @@
+import base64
+import socket
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import unquote, urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+
+class Proxy(NamedTuple):
+    host: str
+    port: int
+    headers: Dict[str, str]
+
+
+def proxy_for(scheme: str, netloc: str) -> Optional[Proxy]:
+    '''
+    The proxy to reach `netloc` through, from the same HTTP_PROXY,
+    HTTPS_PROXY and NO_PROXY settings urllib honours, if any.
+    '''
+    url = getproxies().get(scheme)
+    host = urlsplit(f'//{netloc}').hostname or netloc
+    if not url or proxy_bypass(host):
+        return None
+    proxy = urlsplit(url if '://' in url else f'http://{url}')
+    if proxy.scheme != 'http' or not proxy.hostname:
+        raise ValueError(f'Unsupported proxy: {url}')
+    headers = {}
+    if proxy.username is not None:
+        credentials = (
+            f'{unquote(proxy.username)}:{unquote(proxy.password or "")}'
+        )
+        headers['Proxy-Authorization'] = 'Basic ' + base64.b64encode(
+            credentials.encode('utf-8'),
+        ).decode('ascii')
+    return Proxy(proxy.hostname, proxy.port or 80, headers)
+
+
+def tunnel(
+    proxy: Proxy, host: str, port: int, timeout: float,
+) -> socket.socket:
+    '''A socket to `host:port` through an HTTP CONNECT tunnel.'''
+    target = f'[{host}]:{port}' if ':' in host else f'{host}:{port}'
+    sock = socket.create_connection((proxy.host, proxy.port), timeout)
+    try:
+        headers = {'Host': target, **proxy.headers}
+        request = f'CONNECT {target} HTTP/1.1\r\n' + ''.join(
+            f'{name}: {value}\r\n' for name, value in headers.items()
+        ) + '\r\n'
+        sock.sendall(request.encode('latin-1'))
+        head = b''
+        while b'\r\n\r\n' not in head:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionResetError('Proxy closed the connection')
+            head += chunk
+        status_line = head.split(b'\r\n', 1)[0].decode('latin-1')
+        if status_line.split()[1:2] != ['200']:
+            raise OSError(
+                f'Proxy refused to tunnel to {target}: {status_line}'
+            )
+    except BaseException:
+        sock.close()
+        raise
+    return sock
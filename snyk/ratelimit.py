@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Callable, ContextManager, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+
+class RateLimitTimeout(Exception):
+    '''Waiting for the rate limit would take longer than allowed.'''
+
+
+class TokenBucket:
+    '''
+    Thread-safe token bucket limiting requests to `rate` per second, with
+    bursts of up to `capacity` requests.
+
+    When the server throttles us, `throttle` halves the rate (down to
+    `min_rate`) and makes every caller wait out the server's delay; each
+    successful request then lets the rate `recover` towards `max_rate`.
+    Throttles that arrive while an earlier pause is still in force, as
+    when several requests in flight are throttled together, overlap with
+    it rather than adding to it, and halve the rate only once.
+
+    bucket = TokenBucket(10)
+    bucket.acquire()  # blocks until a request may be sent
+    '''
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _state(self) -> ContextManager[object]:
+        '''Hold this while reading or changing the bucket.'''
+        return self._lock
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated) * self.rate,
+        )
+        self._updated = now
+
+    def reserve(
+        self, tokens: float = 1, timeout: Optional[float] = None,
+    ) -> float:
+        '''
+        Take `tokens` and return how long the caller must wait first. If
+        that would be longer than `timeout`, take nothing and raise
+        RateLimitTimeout.
+        '''
+        with self._state():
+            self._refill()
+            delay = max(0.0, (tokens - self._tokens) / self.rate)
+            if timeout is not None and delay > timeout:
+                raise RateLimitTimeout(
+                    f'Rate limit wait of {delay:.1f}s is longer than '
+                    f'{timeout:.1f}s'
+                )
+            self._tokens -= tokens
+            return delay
+
+    def acquire(
+        self, tokens: float = 1, timeout: Optional[float] = None,
+    ) -> None:
+        delay = self.reserve(tokens, timeout)
+        if delay > 0:
+            self.sleep(delay)
+
+    def throttle(self, delay: float = 0.0) -> None:
+        '''Back off after being throttled, pausing everyone for `delay`.'''
+        with self._state():
+            self._refill()
+            if self._updated >= self._paused_until:
+                self.rate = max(self.min_rate, self.rate / 2)
+            self._paused_until = max(
+                self._paused_until, self._updated + delay,
+            )
+            self._tokens = min(self._tokens, -delay * self.rate)
+
+    def recover(self) -> None:
+        if self.rate >= self.max_rate:
+            return
+        with self._state():
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def wait_time(self) -> float:
+        '''How long a request made now would have to wait.'''
+        with self._state():
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+
+def state_file(token: str) -> str:
+    '''
+    A per-user, per-token state file for FileTokenBucket, shared by that
+    user's processes on this host.
+    '''
+    digest = hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(
+        tempfile.gettempdir(), f'snyk-ratelimit-{os.getuid()}-{digest}.json',
+    )
+
+
+class FileTokenBucket(TokenBucket):
+    '''
+    TokenBucket whose state lives in a file locked with flock, so that every
+    process on the host using the same file shares one rate limit, and
+    backs off together when any of them is throttled.
+
+    bucket = FileTokenBucket(10, state_file(token))
+    '''
+
+    def __init__(
+        self,
+        rate: float,
+        filename: str,
+        capacity: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if fcntl is None:
+            raise RuntimeError('FileTokenBucket needs fcntl')
+        super().__init__(rate, capacity, min_rate, clock, sleep)
+        self.filename = filename
+
+    def _open(self) -> IO[str]:
+        '''
+        Open the state file, creating it readable by this user only. It
+        usually sits in the shared temp directory, so symlinks and files
+        owned by other users are refused rather than followed or trusted.
+        '''
+        fd = os.open(
+            self.filename, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600,
+        )
+        try:
+            if os.fstat(fd).st_uid != os.getuid():
+                raise PermissionError(
+                    f'{self.filename} is owned by another user',
+                )
+            return os.fdopen(fd, 'r+')
+        except BaseException:
+            os.close(fd)
+            raise
+
+    @contextmanager
+    def _state(self) -> Iterator[object]:
+        with self._lock, self._open() as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                state = json.loads(f.read())
+                self._tokens = state['tokens']
+                self._updated = state['updated']
+                self.rate = min(self.max_rate, state['rate'])
+                self._paused_until = state.get('paused_until', 0.0)
+            except (ValueError, KeyError, TypeError):
+                # A new or unreadable file starts from a full bucket.
+                self._tokens = self.capacity
+                self._updated = self.clock()
+                self.rate = self.max_rate
+                self._paused_until = 0.0
+            yield self
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({
+                'tokens': self._tokens,
+                'updated': self._updated,
+                'rate': self.rate,
+                'paused_until': self._paused_until,
+            }))
@@ -0,0 +1,112 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+from http.client import HTTPMessage
+from typing import Callable, Collection, Optional
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Statuses that say the server did not act on the request, so that even a
+# request that is not idempotent can be sent again.
+UNPROCESSED_STATUSES = (429, 503)
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+
+
+def retry_after(headers: Optional[HTTPMessage]) -> Optional[float]:
+    '''
+    Seconds the server asked us to wait, from `Retry-After` or, once the
+    rate limit is exhausted, `X-RateLimit-Reset`.
+    '''
+    if headers is None:
+        return None
+    value = headers.get('Retry-After')
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, when - time.time())
+    if headers.get('X-RateLimit-Remaining') == '0':
+        try:
+            reset = float(headers.get('X-RateLimit-Reset', ''))
+        except ValueError:
+            return None
+        # The reset is either an epoch timestamp or a number of seconds.
+        if reset > 1e9:
+            reset -= time.time()
+        return max(0.0, reset)
+    return None
+
+
+class RetryPolicy:
+    '''
+    How HTTPClient retries throttled (429), failed (5xx) and dropped
+    requests: up to `max_retries` times, with exponential backoff and full
+    jitter unless the server says how long to wait, and never sleeping more
+    than `budget` seconds in total for one request. Requests that are not
+    idempotent, such as starting an import, are only retried when the
+    server cannot have acted on them: on `unprocessed_statuses`, or when
+    the connection failed before the request was sent. Given a `deadline`
+    on the `clock`, no retry waits past it.
+    '''
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 60.0,
+        budget: float = 300.0,
+        statuses: Collection[int] = RETRY_STATUSES,
+        unprocessed_statuses: Collection[int] = UNPROCESSED_STATUSES,
+        jitter: Callable[[], float] = random.random,
+        sleep: Callable[[float], None] = time.sleep,
+        deadline: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.statuses = statuses
+        self.unprocessed_statuses = unprocessed_statuses
+        self.jitter = jitter
+        self.sleep = sleep
+        self.deadline = deadline
+        self.clock = clock
+
+    def retries_status(self, status: int, idempotent: bool) -> bool:
+        return status in self.statuses and (
+            idempotent or status in self.unprocessed_statuses
+        )
+
+    def allows(self, attempt: int, waited: float, delay: float) -> bool:
+        '''
+        Whether to retry after `attempt`, having waited `waited` seconds so
+        far, by waiting `delay` more.
+        '''
+        return not (
+            attempt >= self.max_retries or
+            waited + delay > self.budget or
+            self.deadline is not None and self.clock() + delay > self.deadline
+        )
+
+    def remaining(self) -> Optional[float]:
+        '''Seconds left until the deadline, if there is one.'''
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - self.clock())
+
+    def delay(self, attempt: int, headers: Optional[HTTPMessage]) -> float:
+        hinted = retry_after(headers)
+        if hinted is not None:
+            return min(hinted, self.max_backoff)
+        return self.jitter() * min(
+            self.max_backoff, self.backoff * 2 ** attempt,
+        )
+
+
+NO_RETRY = RetryPolicy(max_retries=0)
@@ -0,0 +1,118 @@
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+
+# Seconds an operation of a kind not seen yet is assumed to take.
+INITIAL_ESTIMATE = 1.0
+# Weight of the latest observation in the moving average of latencies.
+SMOOTHING = 0.3
+
+
+class Operation(NamedTuple):
+    priority: int
+    kind: str
+    item: Any
+
+
+class Outcome(NamedTuple):
+    '''The operations a Scheduler run did not complete.'''
+    postponed: List[Operation]
+    failed: List[Tuple[Operation, Exception]]
+
+
+class Scheduler:
+    '''
+    Runs operations from a pool of workers, lowest priority number first,
+    starting each only if it is expected to finish before the deadline.
+    How long an operation takes is estimated per kind, from an exponentially
+    weighted moving average of the ones run so far.
+
+    scheduler = Scheduler(time.monotonic() + 600)
+    outcome = scheduler.run(operations, {'import': ..., 'delete': ...})
+    '''
+
+    def __init__(
+        self,
+        deadline: float,
+        workers: int = 4,
+        initial_estimate: float = INITIAL_ESTIMATE,
+        smoothing: float = SMOOTHING,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.deadline = deadline
+        self.workers = workers
+        self.initial_estimate = initial_estimate
+        self.smoothing = smoothing
+        self.clock = clock
+        self.estimates: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - self.clock())
+
+    def estimate(self, kind: str) -> float:
+        return self.estimates.get(kind, self.initial_estimate)
+
+    def observe(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            if kind in self.estimates:
+                seconds = (
+                    self.smoothing * seconds +
+                    (1 - self.smoothing) * self.estimates[kind]
+                )
+            self.estimates[kind] = seconds
+
+    def run(
+        self,
+        operations: Iterable[Operation],
+        handlers: Dict[str, Callable[[Any], Any]],
+    ) -> Outcome:
+        '''
+        Run the operations with the handler for their kind, and return the
+        ones postponed because they would not have finished in time, and
+        the ones whose handler raised along with the error, in priority
+        order. A failed operation does not stop the others.
+        '''
+        queue: List[Tuple[int, int, Operation]] = [
+            (operation.priority, i, operation)
+            for i, operation in enumerate(operations)
+        ]
+        heapq.heapify(queue)
+        postponed: List[Tuple[int, int, Operation]] = []
+        failed: List[Tuple[Tuple[int, int, Operation], Exception]] = []
+        lock = threading.Lock()
+
+        def work() -> None:
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    entry = heapq.heappop(queue)
+                operation = entry[2]
+                started = self.clock()
+                if started + self.estimate(operation.kind) > self.deadline:
+                    with lock:
+                        postponed.append(entry)
+                    continue
+                try:
+                    handlers[operation.kind](operation.item)
+                except Exception as e:
+                    with lock:
+                        failed.append((entry, e))
+                    continue
+                self.observe(operation.kind, self.clock() - started)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(work) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+        return Outcome(
+            [operation for _, _, operation in sorted(postponed)],
+            [
+                (entry[2], error)
+                for entry, error in sorted(failed, key=lambda f: f[0][:2])
+            ],
+        )
@@ -0,0 +1,62 @@
+import threading
+from typing import Callable, Dict, Generic, Optional, TypeVar, cast
+
+
+T = TypeVar('T')
+
+
+class _Call(Generic[T]):
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+    '''
+    Lets concurrent calls with the same key share one call and its result
+    or exception. Nothing is kept once the call returns; `forget` stops
+    later callers from joining a call still in flight, e.g. after a write
+    may have made its result stale.
+
+    flight = SingleFlight()
+    flight.do('orgs', lambda: fetch('orgs'))
+    '''
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call[T]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return cast(T, call.result)
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return cast(T, call.result)
+
+    def forget(self, prefix: str = '') -> None:
+        '''Let calls for keys starting with `prefix` start afresh.'''
+        with self._lock:
+            for key in [key for key in self._calls if key.startswith(prefix)]:
+                del self._calls[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -1,11 +1,30 @@
 import argparse
+import hashlib
 import json
 import logging
 import os
+import signal
+import sys
+import threading
 import time
 
-from typing import cast, Any, List, Union
-from snyk import Snyk, Org, Project
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from typing import (
+    cast, AbstractSet, Any, Callable, ContextManager, Dict, IO, Iterable,
+    Iterator, List, NamedTuple, Optional, Set, Tuple, Union,
+)
+from snyk import (
+    DEFAULT_BRANCH, IMPORT_BATCH_SIZE, SNYK_API_URL, TIMEOUT, ConnectionPool,
+    ImportJob, ImportResult, Snyk, Org, Project, RetryPolicy, TokenBucket,
+    batched, index_by_repo, wait_for_imports,
+)
+from snyk.cache import ResponseCache
+from snyk.metrics import Metrics
+from snyk.profiling import Profiler
+from snyk.schedule import Operation, Outcome, Scheduler
+from snyk.ratelimit import FileTokenBucket, state_file
+from snyk.imports import POLL_TIMEOUT
 
 
 logging.basicConfig(format='[%(asctime)s] %(message)s',
@@ -13,85 +32,1520 @@ logging.basicConfig(format='[%(asctime)s] %(message)s',
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_RPS = 5.0
+DEFAULT_MAX_RETRIES = 5
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_FULL_EVERY = 24.0
+DEFAULT_ORG_WORKERS = 4
+DEFAULT_WATCH_INTERVAL = 5.0
+# Longest wait, in seconds, before retrying a failed watch run.
+MAX_WATCH_BACKOFF = 600.0
+# Which kind of operation runs first when working to a deadline.
+DELETES_FIRST = 'deletes'
+IMPORTS_FIRST = 'imports'
+
+# Characters to skip before the array starts, and between its elements.
+JSON_SKIP = {False: ' \t\r\n', True: ' \t\r\n,'}
+
 
 def find_org(snyk: Snyk, org_name: str) -> Org:
-    orgs = snyk.orgs()
-    return [o for o in orgs if o.name == org_name][0]
+    return snyk.org(org_name)
+
 
+def block_repos(obj: Dict[str, Any]) -> List[str]:
+    '''The repos one block of the access file enables Snyk for.'''
+    snyk: Union[List[str], bool] = obj.get('apps', {}).get('snyk', [])
+    if type(snyk) is bool and snyk is True:
+        return obj.get('repos', [])
+    elif type(snyk) is not bool:
+        return cast(List[str], snyk)
+    return []
 
-def repos_to_import(data: List[Any]) -> List[str]:
-    snyk_repos: List[str] = []
+
+def repos_to_import(data: Iterable[Any]) -> Set[str]:
+    snyk_repos: Set[str] = set()
     for obj in data:
-        snyk: Union[List[str], bool] = obj.get('apps', {}).get('snyk', [])
-        if type(snyk) is bool and snyk is True:
-            snyk_repos += obj.get('repos', [])
-        elif type(snyk) is not bool:
-            snyk_repos += cast(List[str], snyk)
+        snyk_repos.update(block_repos(obj))
     return snyk_repos
 
 
+def iter_repos_to_import(
+    data: Iterable[Any], seen: Optional[Set[str]] = None,
+) -> Iterator[str]:
+    '''Yield each repo to import once, as the blocks arrive.'''
+    seen = set() if seen is None else seen
+    for obj in data:
+        for repo in block_repos(obj):
+            if repo not in seen:
+                seen.add(repo)
+                yield repo
+
+
+def iter_json_array(
+    f: IO[str], chunk_size: int = STREAM_CHUNK_SIZE,
+) -> Iterator[Any]:
+    '''
+    Yield the elements of the top-level JSON array in `f` one at a time,
+    reading it `chunk_size` characters at a time rather than all at once.
+    '''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in JSON_SKIP[started]:
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError('Unexpected end of JSON array')
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        if not started:
+            if buffer[pos] != '[':
+                raise ValueError('Expected a JSON array')
+            started = True
+            pos += 1
+            continue
+        if buffer[pos] == ']':
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            obj, end = None, -1
+        # An element running to the end of the buffer may be cut short.
+        if end == -1 or (end == len(buffer) and not eof):
+            if eof:
+                raise ValueError('Invalid JSON array element')
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield obj
+        buffer = buffer[end:]
+        pos = 0
+
+
+def owned_by(project: Project, owner: str) -> bool:
+    return project.origin == 'github' and project.name.startswith(f'{owner}/')
+
+
 def projects_to_delete(
-    projects: List[Project],
-    imported_repos: List[str],
+    projects: Iterable[Project],
+    imported_repos: AbstractSet[str],
+    owner: str,
 ) -> List[Project]:
     return [
         project for project in projects
         if (
-            project.origin == 'github' and
+            owned_by(project, owner) and
             project.repo_name not in imported_repos
         )
     ]
 
 
-def main(owner: str, org_name: str, filename: str) -> None:
+class Plan(NamedTuple):
+    to_import: List[str]
+    to_delete: List[Project]
+    unchanged: List[str]
+
+
+def owner_repos(
+    by_repo: Dict[str, List[Project]], owner: str,
+) -> Dict[str, List[Project]]:
+    '''
+    `owner`'s part of an index of projects by `owner/repo`, keyed by the
+    bare repo name the access file uses.
+    '''
+    prefix = f'{owner}/'
+    return {
+        name[len(prefix):]: projects
+        for name, projects in by_repo.items() if name.startswith(prefix)
+    }
+
+
+def plan_changes(
+    by_repo: Dict[str, List[Project]], repos: AbstractSet[str], owner: str,
+) -> Plan:
+    '''
+    Diff the desired repos against `owner`'s GitHub projects in the org,
+    indexed by the `owner/repo` they were imported from. Other owners'
+    projects are left alone.
+    '''
+    existing = owner_repos(by_repo, owner)
+    return Plan(
+        to_import=sorted(repos - existing.keys()),
+        to_delete=[
+            project
+            for repo, repo_projects in existing.items() if repo not in repos
+            for project in repo_projects
+        ],
+        unchanged=sorted(repos & existing.keys()),
+    )
+
+
+def file_hash(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Journal:
+    '''
+    Append-only log of the imports and deletes a run has completed, one
+    JSON object per line, keyed by org, owner and access-file hash. A run
+    that resumes skips whatever the last unfinished run for the same key
+    did.
+    '''
+
+    IMPORT = 'import'
+    DELETE = 'delete'
+
+    # Shared, as orgs reconciled in parallel may append to the same file.
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        filename: str,
+        org_id: str,
+        access_hash: str,
+        owner: Optional[str] = None,
+    ):
+        self.filename = filename
+        self.key = {'org': org_id, 'access': access_hash}
+        if owner is not None:
+            self.key['owner'] = owner
+        self.done: Set[Tuple[str, str]] = set()
+
+    def _entries(self) -> Iterator[Dict[str, Any]]:
+        try:
+            f = open(self.filename)
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short when the previous run died.
+                    continue
+                if all(entry.get(k) == v for k, v in self.key.items()):
+                    yield entry
+
+    def resume(self) -> None:
+        '''Load what the last run for this org and file completed.'''
+        done: Set[Tuple[str, str]] = set()
+        for entry in self._entries():
+            if entry['event'] in ('start', 'finish'):
+                done = set()
+            else:
+                done.add((entry['event'], entry['target']))
+        self.done = done
+
+    def _append(self, entries: List[Dict[str, Any]]) -> None:
+        lines = ''.join(
+            json.dumps({**self.key, **entry}) + '\n' for entry in entries
+        )
+        with self._lock, open(self.filename, 'a') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self) -> None:
+        self.done = set()
+        self._append([{'event': 'start', 'time': time.time()}])
+
+    def finish(self) -> None:
+        self._append([{'event': 'finish', 'time': time.time()}])
+
+    def record(self, event: str, targets: Iterable[str]) -> None:
+        self._append([
+            {'event': event, 'target': target} for target in targets
+        ])
+
+    def __contains__(self, operation: Tuple[str, str]) -> bool:
+        return operation in self.done
+
+
+class Snapshot(NamedTuple):
+    full: float
+    repos: Set[str]
+
+    def stale(self, full_every: float) -> bool:
+        '''Whether the last full reconcile was over `full_every` hours ago.'''
+        return time.time() - self.full >= full_every * 3600
+
+
+def snapshot_file(state_dir: str, org_id: str, owner: str) -> str:
+    return os.path.join(state_dir, f'{org_id}-{owner}.snapshot')
+
+
+def load_snapshot(filename: str) -> Optional[Snapshot]:
+    '''
+    The repos the last successful run applied, and when it last did a full
+    reconcile, or None if there is no usable snapshot.
+    '''
+    try:
+        with open(filename) as f:
+            header = json.loads(f.readline())
+            repos = {line.rstrip('\n') for line in f if line.strip()}
+    except (OSError, ValueError):
+        return None
+    if not isinstance(header, dict) or 'full' not in header:
+        return None
+    return Snapshot(header['full'], repos)
+
+
+def save_snapshot(filename: str, snapshot: Snapshot) -> None:
+    '''
+    Write a JSON header line followed by the repos one per line, sorted,
+    replacing any previous snapshot atomically.
+    '''
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    tmp = f'{filename}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(json.dumps({'full': snapshot.full}) + '\n')
+        f.writelines(f'{repo}\n' for repo in sorted(snapshot.repos))
+    os.replace(tmp, filename)
+
+
+def load_repos(filename: str, stream: bool = False) -> Set[str]:
+    with open(filename) as f:
+        if stream:
+            return repos_to_import(iter_json_array(f))
+        return repos_to_import(json.load(f))
+
+
+def import_repos(
+    org: Org,
+    owner: str,
+    repos: List[str],
+    journal: Optional[Journal] = None,
+) -> List[ImportJob]:
+    logger.info(f'Importing {", ".join(repos)}')
+    jobs = list(org.import_github_projects(
+        [(owner, repo, DEFAULT_BRANCH) for repo in repos],
+        batch_size=len(repos),
+    ))
+    if journal is not None:
+        journal.record(Journal.IMPORT, repos)
+    return jobs
+
+
+def report_imports(results: List[ImportResult]) -> Set[str]:
+    '''Log how the imports went, and return the repos not imported.'''
+    for result in results:
+        if not result.success:
+            logger.info(
+                f'Import of {result.repo} {result.status} '
+                f'after {result.duration:.1f}s'
+            )
+    succeeded = sum(1 for result in results if result.success)
+    slowest = max((result.duration for result in results), default=0.0)
+    logger.info(
+        f'{succeeded} of {len(results)} imports succeeded, '
+        f'slowest took {slowest:.1f}s'
+    )
+    return {result.repo for result in results if not result.success}
+
+
+def delete_project(
+    project: Project, journal: Optional[Journal] = None,
+) -> None:
+    logger.info(f'Removing {project.name}')
+    project.delete()
+    if journal is not None:
+        journal.record(Journal.DELETE, [project.id])
+
+
+def run_concurrently(
+    func: Callable[[Any], Any], items: Iterable[Any], workers: int,
+) -> List[Any]:
+    '''
+    Call `func` on each item from a pool of `workers` threads, and return
+    the results in order. Items are taken from `items` only as the workers
+    catch up, at most `2 * workers` ahead, so a lazy iterable such as a
+    streamed access file is read at the pace of the work.
+    '''
+    window = threading.BoundedSemaphore(2 * workers)
+    futures: List[Future] = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for item in items:
+            window.acquire()
+            future = executor.submit(func, item)
+            future.add_done_callback(lambda _: window.release())
+            futures.append(future)
+    return [future.result() for future in futures]
+
+
+def open_journal(
+    filename: str,
+    org_id: str,
+    access_hash: str,
+    resume: bool = False,
+    owner: Optional[str] = None,
+) -> Journal:
+    journal = Journal(filename, org_id, access_hash, owner)
+    if resume:
+        journal.resume()
+        logger.info(
+            f'Resuming: skipping {len(journal.done)} completed operations'
+        )
+    else:
+        journal.start()
+    return journal
+
+
+def import_in_batches(
+    org: Org,
+    owner: str,
+    repos: Iterable[str],
+    batch_size: int = IMPORT_BATCH_SIZE,
+    workers: int = DEFAULT_WORKERS,
+    journal: Optional[Journal] = None,
+    profiler: Optional[Profiler] = None,
+) -> List[ImportJob]:
+    '''
+    Start importing the repos the journal has not seen, `batch_size` per
+    request and `workers` requests at a time, and return the jobs started.
+    '''
+    if journal is not None:
+        repos = (
+            repo for repo in repos if (Journal.IMPORT, repo) not in journal
+        )
+    batches = run_concurrently(
+        profiled(
+            profiler,
+            lambda batch: import_repos(org, owner, batch, journal),
+        ),
+        batched(repos, batch_size),
+        workers,
+    )
+    return [job for jobs in batches for job in jobs]
+
+
+def delete_projects(
+    projects: Iterable[Project],
+    workers: int = DEFAULT_WORKERS,
+    journal: Optional[Journal] = None,
+    profiler: Optional[Profiler] = None,
+) -> None:
+    if journal is not None:
+        projects = [
+            project for project in projects
+            if (Journal.DELETE, project.id) not in journal
+        ]
+    run_concurrently(
+        profiled(
+            profiler,
+            lambda project: delete_project(project, journal),
+        ),
+        projects,
+        workers,
+    )
+
+
+def schedule_changes(
+    scheduler: Scheduler,
+    org: Org,
+    owner: str,
+    to_import: Iterable[str],
+    to_delete: Iterable[Project],
+    batch_size: int = IMPORT_BATCH_SIZE,
+    first: str = DELETES_FIRST,
+    journal: Optional[Journal] = None,
+    profiler: Optional[Profiler] = None,
+) -> Tuple[List[ImportJob], Outcome]:
+    '''
+    Run the import batches and deletes the journal has not seen through the
+    scheduler, `first` first. Returns the import jobs started, and the
+    operations postponed to keep to the deadline or that failed.
+    '''
+    import_priority, delete_priority = (
+        (1, 0) if first == DELETES_FIRST else (0, 1)
+    )
+    if journal is not None:
+        to_import = [
+            repo for repo in to_import
+            if (Journal.IMPORT, repo) not in journal
+        ]
+        to_delete = [
+            project for project in to_delete
+            if (Journal.DELETE, project.id) not in journal
+        ]
+    operations = [
+        Operation(import_priority, Journal.IMPORT, batch)
+        for batch in batched(to_import, batch_size)
+    ] + [
+        Operation(delete_priority, Journal.DELETE, project)
+        for project in to_delete
+    ]
+    jobs: List[ImportJob] = []
+
+    def start_import(repos: List[str]) -> None:
+        jobs.extend(import_repos(org, owner, repos, journal))
+
+    outcome = scheduler.run(operations, {
+        Journal.IMPORT: profiled(profiler, start_import),
+        Journal.DELETE: profiled(
+            profiler, lambda project: delete_project(project, journal),
+        ),
+    })
+    return jobs, outcome
+
+
+def report_postponed(postponed: List[Operation]) -> None:
+    if not postponed:
+        return
+    repos = [
+        repo for operation in postponed
+        if operation.kind == Journal.IMPORT
+        for repo in operation.item
+    ]
+    projects = [
+        operation.item.name for operation in postponed
+        if operation.kind == Journal.DELETE
+    ]
+    logger.info(
+        f'Postponed to keep to the deadline: {len(repos)} imports, '
+        f'{len(projects)} deletes'
+    )
+    if repos:
+        logger.info(f'Postponed imports: {", ".join(repos)}')
+    if projects:
+        logger.info(f'Postponed deletes: {", ".join(projects)}')
+
+
+def report_failed(failed: List[Tuple[Operation, Exception]]) -> Set[str]:
+    '''Log the scheduled operations that failed, and return their repos.'''
+    repos: Set[str] = set()
+    for operation, error in failed:
+        if operation.kind == Journal.IMPORT:
+            repos.update(operation.item)
+            logger.error(
+                f'Importing {", ".join(operation.item)} failed: {error}'
+            )
+        else:
+            logger.error(f'Removing {operation.item.name} failed: {error}')
+    return repos
+
+
+def stream_imports(
+    existing: AbstractSet[str],
+    filename: str,
+    import_all: Callable[[Iterable[str]], List[ImportJob]],
+) -> Tuple[Set[str], int, List[ImportJob]]:
+    '''
+    Import repos not in `existing` while the access file is still being
+    parsed. Returns every repo the file lists, how many were imported and
+    the import jobs started.
+    '''
+    repos: Set[str] = set()
+    imported = 0
+
+    def to_import() -> Iterator[str]:
+        nonlocal imported
+        for repo in iter_repos_to_import(iter_json_array(f), repos):
+            if repo not in existing:
+                imported += 1
+                yield repo
+
+    with open(filename) as f:
+        jobs = import_all(to_import())
+    return repos, imported, jobs
+
+
+def make_rate_limiter(
+    token: str, max_rps: float, shared: bool = False,
+) -> Optional[TokenBucket]:
+    if max_rps <= 0:
+        return None
+    if shared:
+        limiter = FileTokenBucket(max_rps, state_file(token))
+        logger.info(
+            f'Sharing a rate limit of {max_rps} requests per second with '
+            f'other processes, current wait {limiter.wait_time():.1f}s'
+        )
+        return limiter
+    return TokenBucket(max_rps)
+
+
+def make_snyk(
+    max_rps: float = DEFAULT_MAX_RPS,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    cache_dir: Optional[str] = None,
+    pool: Optional[ConnectionPool] = None,
+    shared_rate_limit: bool = False,
+    metrics: Optional[Metrics] = None,
+    scheduler: Optional[Scheduler] = None,
+) -> Snyk:
+    '''
+    The client for a run. With a `scheduler`, retries never wait past its
+    deadline, so a throttled request cannot overrun it.
+    '''
+    token = os.environ['SNYK_TOKEN']
+    return Snyk(
+        token,
+        url=os.environ.get('SNYK_API_URL', SNYK_API_URL),
+        rate_limiter=make_rate_limiter(token, max_rps, shared_rate_limit),
+        retry_policy=RetryPolicy(
+            max_retries=max_retries,
+            deadline=scheduler.deadline if scheduler is not None else None,
+            clock=scheduler.clock if scheduler is not None else time.monotonic,
+        ),
+        cache=ResponseCache(cache_dir) if cache_dir else None,
+        pool=pool,
+        metrics=metrics,
+    )
+
+
+def timed(
+    snyk: Snyk, phase: str, profiler: Optional[Profiler] = None,
+) -> ContextManager[Any]:
+    metrics = snyk.client.metrics
+    if profiler is None:
+        return metrics.phase(phase) if metrics is not None else nullcontext()
+    stack = ExitStack()
+    if metrics is not None:
+        stack.enter_context(metrics.phase(phase))
+    stack.enter_context(profiler.phase(phase))
+    return stack
+
+
+def profiled(
+    profiler: Optional[Profiler], func: Callable[..., Any],
+) -> Callable[..., Any]:
+    return profiler.wrap(func) if profiler is not None else func
+
+
+def log_connections(snyk: Snyk) -> None:
+    client = snyk.client
+    pool = client.pool
+    logger.info(
+        f'HTTP connections: {pool.created} new, {pool.reused} reused'
+    )
+    logger.info(
+        f'HTTP responses: {client.bytes_received} bytes received, '
+        f'{client.bytes_decoded} decompressed'
+    )
+
+
+class RunOptions(NamedTuple):
+    '''How to carry out a reconcile run, as given on the command line.'''
+    workers: int = DEFAULT_WORKERS
+    org_workers: int = DEFAULT_ORG_WORKERS
+    max_rps: float = DEFAULT_MAX_RPS
+    max_retries: int = DEFAULT_MAX_RETRIES
+    shared_rate_limit: bool = False
+    batch_size: int = IMPORT_BATCH_SIZE
+    import_timeout: float = POLL_TIMEOUT
+    cache_dir: Optional[str] = None
+    stream: bool = False
+    journal_file: Optional[str] = None
+    resume: bool = False
+    state_dir: Optional[str] = None
+    full_every: float = DEFAULT_FULL_EVERY
+    metrics_file: Optional[str] = None
+    profile_dir: Optional[str] = None
+    profile_memory: bool = False
+    deadline: Optional[float] = None
+    first: str = DELETES_FIRST
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> 'RunOptions':
+        return cls(
+            workers=args.workers,
+            org_workers=args.org_workers,
+            max_rps=args.max_rps,
+            max_retries=args.max_retries,
+            shared_rate_limit=args.shared_rate_limit,
+            batch_size=args.import_batch_size,
+            import_timeout=args.import_timeout,
+            cache_dir=args.cache_dir,
+            stream=args.stream,
+            journal_file=args.journal,
+            resume=args.resume,
+            state_dir=args.state_dir,
+            full_every=args.full_every,
+            metrics_file=args.metrics,
+            profile_dir=args.profile,
+            profile_memory=args.profile_memory,
+            deadline=args.deadline,
+            first=args.first,
+        )
+
+
+class Session(NamedTuple):
+    '''The client, scheduler and instruments shared by a run's reconciles.'''
+    snyk: Snyk
+    scheduler: Optional[Scheduler]
+    metrics: Optional[Metrics]
+    profiler: Optional[Profiler]
+
+
+def open_session(
+    options: RunOptions, pool: Optional[ConnectionPool] = None,
+) -> Session:
+    scheduler = (
+        Scheduler(time.monotonic() + options.deadline, options.workers)
+        if options.deadline is not None else None
+    )
+    metrics = Metrics() if options.metrics_file else None
+    snyk = make_snyk(
+        options.max_rps,
+        options.max_retries,
+        options.cache_dir,
+        pool=pool,
+        shared_rate_limit=options.shared_rate_limit,
+        metrics=metrics,
+        scheduler=scheduler,
+    )
+    profiler = (
+        Profiler(options.profile_dir, options.profile_memory)
+        if options.profile_dir else None
+    )
+    return Session(snyk, scheduler, metrics, profiler)
+
+
+def write_metrics(session: Session, options: RunOptions) -> None:
+    if session.metrics is not None and options.metrics_file:
+        session.metrics.write(options.metrics_file)
+
+
+def close_session(session: Session, options: RunOptions) -> None:
+    log_connections(session.snyk)
+    write_metrics(session, options)
+    if session.profiler is not None:
+        session.profiler.close()
+
+
+def main(
+    owner: str,
+    org_name: str,
+    filename: str,
+    options: RunOptions = RunOptions(),
+    watch_interval: Optional[float] = None,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    session = open_session(options)
+    resume = options.resume
+
+    def run(previous: Optional[Snapshot] = None) -> Snapshot:
+        nonlocal resume
+        if previous is not None and previous.stale(options.full_every):
+            # Pick up changes to the orgs and integrations on full resyncs.
+            session.snyk.refresh_orgs()
+        snapshot = reconcile(
+            session, owner, org_name, filename,
+            options._replace(resume=resume), previous=previous,
+        )
+        # Only the first run picks up where an interrupted one left off.
+        resume = False
+        write_metrics(session, options)
+        return snapshot
+
+    if watch_interval is None:
+        run()
+    else:
+        watch(filename, run, options.full_every, watch_interval, stop)
+    close_session(session, options)
+
+
+def watch(
+    filename: str,
+    run: Callable[[Optional[Snapshot]], Snapshot],
+    full_every: float = DEFAULT_FULL_EVERY,
+    interval: float = DEFAULT_WATCH_INTERVAL,
+    stop: Optional[threading.Event] = None,
+    max_backoff: float = MAX_WATCH_BACKOFF,
+    clock: Callable[[], float] = time.monotonic,
+) -> None:
+    '''
+    Check `filename` every `interval` seconds until `stop` is set, calling
+    `run` with the last snapshot applied whenever the file changes or a
+    full reconcile is due. A failed run is retried as soon as the file
+    changes again, or else after a wait that doubles with each failure,
+    up to `max_backoff` seconds.
+    '''
+    stop = threading.Event() if stop is None else stop
+    logger.info(f'Watching {filename} for changes')
+    snapshot: Optional[Snapshot] = None
+    applied_mtime: Optional[int] = None
+    failed_mtime: Optional[int] = None
+    failures = 0
+    retry_at = 0.0
+    while not stop.is_set():
+        try:
+            mtime: Optional[int] = os.stat(filename).st_mtime_ns
+        except OSError as e:
+            logger.warning(f'Cannot read {filename}: {e}')
+            mtime = None
+        due = snapshot is None or snapshot.stale(full_every)
+        backing_off = mtime == failed_mtime and clock() < retry_at
+        if (
+            mtime is not None and (mtime != applied_mtime or due) and
+            not backing_off
+        ):
+            try:
+                snapshot = run(snapshot)
+                applied_mtime = mtime
+                failed_mtime = None
+                failures = 0
+            except Exception:
+                failures += 1
+                backoff = min(max_backoff, interval * 2 ** failures)
+                failed_mtime = mtime
+                retry_at = clock() + backoff
+                logger.exception(
+                    f'Reconcile failed, retrying in {backoff:.0f}s or when '
+                    f'{filename} changes'
+                )
+        stop.wait(interval)
+
+
+def last_applied(
+    previous: Optional[Snapshot],
+    snapshot_path: Optional[str],
+    full_every: float = DEFAULT_FULL_EVERY,
+) -> Optional[Snapshot]:
+    '''
+    The snapshot to apply changes since: `previous`, or else the one saved
+    at `snapshot_path`, unless the last full reconcile is too old.
+    '''
+    snapshot = previous
+    if snapshot is None and snapshot_path is not None:
+        snapshot = load_snapshot(snapshot_path)
+    if snapshot is not None and snapshot.stale(full_every):
+        logger.info('Last full reconcile is too old, running a full one')
+        return None
+    return snapshot
+
+
+class Changes(NamedTuple):
+    '''
+    What a reconcile is to change: every repo the access file lists, the
+    repos to import and the repos whose projects to remove. `listing` is
+    the org's projects by repo while it is still current, and `jobs` the
+    imports already started while the access file was read.
+    '''
+    repos: Set[str]
+    to_import: List[str]
+    removed: Set[str]
+    full: float
+    listing: Optional[Dict[str, List[Project]]]
+    jobs: List[ImportJob]
+
+
+def list_projects(
+    snyk: Snyk, org: Org, profiler: Optional[Profiler] = None,
+) -> Dict[str, List[Project]]:
+    with timed(snyk, 'list_projects', profiler):
+        return index_by_repo(org.iter_projects(origin='github'))
+
+
+def incremental_changes(repos: Set[str], snapshot: Snapshot) -> Changes:
+    '''The changes to the access file since `snapshot` was applied.'''
+    added = sorted(repos - snapshot.repos)
+    removed = snapshot.repos - repos
+    logger.info(
+        f'{len(added)} repos added and {len(removed)} removed '
+        f'since the last run'
+    )
+    return Changes(repos, added, removed, snapshot.full, None, [])
+
+
+def full_changes(
+    snyk: Snyk,
+    org: Org,
+    owner: str,
+    repos: Set[str],
+    started: float,
+    profiler: Optional[Profiler] = None,
+) -> Changes:
+    '''The changes to make to the org's projects to match `repos`.'''
+    by_repo = list_projects(snyk, org, profiler)
+    with timed(snyk, 'plan', profiler):
+        plan = plan_changes(by_repo, repos, owner)
+    logger.info(
+        f'{len(plan.to_import)} repos to import, '
+        f'{len(plan.to_delete)} projects to remove, '
+        f'{len(plan.unchanged)} repos unchanged'
+    )
+    removed = set(owner_repos(by_repo, owner).keys() - repos)
+    return Changes(repos, plan.to_import, removed, started, by_repo, [])
+
+
+def streamed_changes(
+    snyk: Snyk,
+    org: Org,
+    owner: str,
+    filename: str,
+    import_all: Callable[[Iterable[str]], List[ImportJob]],
+    started: float,
+    profiler: Optional[Profiler] = None,
+) -> Changes:
+    '''
+    Like full_changes, but importing missing repos while the access file
+    is still being read.
+    '''
+    by_repo = list_projects(snyk, org, profiler)
+    existing = owner_repos(by_repo, owner)
+    logger.info(f'Streaming data from {filename}')
+    with timed(snyk, 'imports', profiler):
+        repos, imported, jobs = stream_imports(
+            existing.keys(), filename, import_all,
+        )
+    logger.info(f'{imported} repos imported of {len(repos)} listed')
+    return Changes(
+        repos, [], existing.keys() - repos, started,
+        None if imported else by_repo, jobs,
+    )
+
+
+def projects_of(
+    snyk: Snyk,
+    org: Org,
+    owner: str,
+    removed: AbstractSet[str],
+    listing: Optional[Dict[str, List[Project]]],
+    profiler: Optional[Profiler] = None,
+) -> List[Project]:
+    '''
+    `owner`'s projects for the `removed` repos, from `listing` if given, or
+    else listed afresh.
+    '''
+    if not removed:
+        return []
+    if listing is not None:
+        existing = owner_repos(listing, owner)
+        return [
+            project for repo in removed
+            for project in existing.get(repo, [])
+        ]
+    with timed(snyk, 'list_projects', profiler):
+        return [
+            project for project in org.iter_projects(origin='github')
+            if owned_by(project, owner) and project.repo_name in removed
+        ]
+
+
+def wait_for(
+    snyk: Snyk,
+    jobs: List[ImportJob],
+    timeout: float,
+    workers: int = DEFAULT_WORKERS,
+    profiler: Optional[Profiler] = None,
+) -> Set[str]:
+    '''Wait for the import jobs, and return the repos not imported.'''
+    if not jobs:
+        return set()
+    logger.info(f'Waiting for {len(jobs)} import jobs to finish')
+    with timed(snyk, 'imports', profiler):
+        return report_imports(wait_for_imports(
+            jobs, timeout=timeout, workers=workers,
+        ))
+
+
+def apply_changes(
+    session: Session,
+    org: Org,
+    owner: str,
+    changes: Changes,
+    import_all: Callable[[Iterable[str]], List[ImportJob]],
+    options: RunOptions,
+    journal: Optional[Journal] = None,
+) -> Tuple[Outcome, Set[str]]:
+    '''
+    Make the changes, and return the operations left undone and the repos
+    not imported. Without a scheduler, the imports are waited for before
+    the projects to delete are listed, so deletes see the imports' results.
+    With one, the imports and deletes run together, most important first,
+    until its deadline.
+    '''
+    snyk, scheduler, profiler = (
+        session.snyk, session.scheduler, session.profiler
+    )
+    if scheduler is None:
+        with timed(snyk, 'imports', profiler):
+            jobs = changes.jobs + import_all(changes.to_import)
+        not_imported = wait_for(
+            snyk, jobs, options.import_timeout, options.workers, profiler,
+        )
+        to_delete = projects_of(
+            snyk, org, owner, changes.removed,
+            None if changes.to_import else changes.listing, profiler,
+        )
+        with timed(snyk, 'deletes', profiler):
+            delete_projects(to_delete, options.workers, journal, profiler)
+        return Outcome([], []), not_imported
+    to_delete = projects_of(
+        snyk, org, owner, changes.removed, changes.listing, profiler,
+    )
+    with timed(snyk, 'scheduled', profiler):
+        jobs, outcome = schedule_changes(
+            scheduler, org, owner, changes.to_import, to_delete,
+            options.batch_size, options.first, journal, profiler,
+        )
+    not_imported = wait_for(
+        snyk, changes.jobs + jobs,
+        min(options.import_timeout, scheduler.remaining()),
+        options.workers, profiler,
+    )
+    report_postponed(outcome.postponed)
+    return outcome, not_imported | report_failed(outcome.failed)
+
+
+def reconcile(
+    session: Session,
+    owner: str,
+    org_name: str,
+    filename: str,
+    options: RunOptions = RunOptions(),
+    access_repos: Optional[Set[str]] = None,
+    previous: Optional[Snapshot] = None,
+) -> Snapshot:
+    '''
+    Bring `owner`'s GitHub projects in the org in line with the access
+    file, and return what was applied. `access_repos` is the file already
+    parsed, when the caller has it. Given the `previous` snapshot, only the
+    changes since are applied, as with a snapshot in the state directory.
+    With a scheduler, work that would overrun its deadline is postponed.
+    '''
     logger.info(
         f'Importing GitHub repos from {owner} into {org_name} org in Snyk'
     )
-    snyk = Snyk(os.environ['SNYK_TOKEN'])
+    snyk, profiler = session.snyk, session.profiler
 
-    org: Org = find_org(snyk, org_name)
+    def load_access_repos() -> Set[str]:
+        if access_repos is not None:
+            return access_repos
+        logger.info(f'Loading data from {filename}')
+        with timed(snyk, 'load_file', profiler):
+            return load_repos(filename, options.stream)
 
-    logger.info(f'Loading data from {filename}')
+    with timed(snyk, 'find_org', profiler):
+        org: Org = find_org(snyk, org_name)
+
+    journal: Optional[Journal] = None
+    if options.journal_file:
+        journal = open_journal(
+            options.journal_file, org.id, file_hash(filename),
+            options.resume, owner,
+        )
+
+    def import_all(to_import: Iterable[str]) -> List[ImportJob]:
+        return import_in_batches(
+            org, owner, to_import, options.batch_size, options.workers,
+            journal, profiler,
+        )
+
+    snapshot_path = (
+        snapshot_file(options.state_dir, org.id, owner)
+        if options.state_dir else None
+    )
+    snapshot = last_applied(previous, snapshot_path, options.full_every)
+    started = time.time()
+    if snapshot is not None:
+        changes = incremental_changes(load_access_repos(), snapshot)
+    elif options.stream and access_repos is None:
+        changes = streamed_changes(
+            snyk, org, owner, filename, import_all, started, profiler,
+        )
+    else:
+        changes = full_changes(
+            snyk, org, owner, load_access_repos(), started, profiler,
+        )
+    outcome, not_imported = apply_changes(
+        session, org, owner, changes, import_all, options, journal,
+    )
+    unfinished = bool(outcome.postponed or outcome.failed)
+    if journal is not None and not unfinished:
+        journal.finish()
+    # Repos whose import failed or was still running when we stopped
+    # waiting are left out of the snapshot, so the next run tries them
+    # again. Postponed or failed work is left for the next run, which must
+    # then be a full reconcile to pick it up.
+    applied = Snapshot(
+        0.0 if unfinished else changes.full, changes.repos - not_imported,
+    )
+    if snapshot_path is not None:
+        save_snapshot(snapshot_path, applied)
+    return applied
+
+
+class ManifestEntry(NamedTuple):
+    owner: str
+    org: str
+    access_file: str
+
+
+def load_manifest(filename: str) -> List[ManifestEntry]:
+    '''
+    Read a JSON list of `{"owner", "org", "access_file"}` objects. Access
+    files are relative to the manifest. Several owners may share an org,
+    but each owner may only appear once per org, as two entries for the
+    same projects would undo each other's work.
+    '''
     with open(filename) as f:
         data = json.load(f)
+    base = os.path.dirname(filename)
+    entries: List[ManifestEntry] = []
+    seen: Set[Tuple[str, str]] = set()
+    for entry in data:
+        key = (entry['owner'], entry['org'])
+        if key in seen:
+            raise ValueError(
+                f'{filename} lists owner {key[0]} in org {key[1]} twice'
+            )
+        seen.add(key)
+        entries.append(ManifestEntry(
+            entry['owner'],
+            entry['org'],
+            os.path.join(base, entry['access_file']),
+        ))
+    return entries
 
-    repos: List[str] = repos_to_import(data)
 
-    for repo in repos:
-        logger.info(f'Importing {repo}')
+def main_manifest(
+    manifest_file: str, options: RunOptions = RunOptions(),
+) -> int:
+    '''
+    Reconcile every owner and org in the manifest, `org_workers` at a time,
+    sharing one client, connection pool, rate limit and cache. Each access
+    file is parsed once. Returns how many entries failed.
+    '''
+    entries = load_manifest(manifest_file)
+    session = open_session(options, ConnectionPool(
+        TIMEOUT, maxsize=options.org_workers * options.workers,
+    ))
+    session.snyk.orgs()
+    access_files = sorted({entry.access_file for entry in entries})
+    logger.info(
+        f'Reconciling {len(entries)} orgs from {len(access_files)} '
+        f'access files'
+    )
+    access_repos = dict(zip(
+        access_files,
+        run_concurrently(load_repos, access_files, options.workers),
+    ))
+
+    def reconcile_entry(entry: ManifestEntry) -> bool:
         try:
-            org.import_github_project(owner, repo)
-        except Exception as e:
-            logger.info(
-                f'Error importing {repo} ({str(e)}). '
-                'Waiting and trying again...'
+            reconcile(
+                session, entry.owner, entry.org, entry.access_file, options,
+                access_repos=access_repos[entry.access_file],
             )
-            time.sleep(5)
-            org.import_github_project(owner, repo)
-        time.sleep(1)
+        except Exception:
+            logger.exception(
+                f'Reconciling {entry.owner} into {entry.org} failed'
+            )
+            return False
+        return True
 
-    to_delete = projects_to_delete(org.projects, repos)
+    results = run_concurrently(reconcile_entry, entries, options.org_workers)
+    close_session(session, options)
+    return results.count(False)
 
-    for project in to_delete:
-        logger.info(f'Removing {project.name}')
-        project.delete()
 
+def write_plan(filename: str, org: Org, owner: str, plan: Plan) -> None:
+    '''
+    Write the plan as JSON lines: a header with everything `apply` needs to
+    know about the org, then one line per import or delete.
+    '''
+    header = {
+        'org': org.id,
+        'org_name': org.name,
+        'owner': owner,
+        'integration': org.integrations['github'],
+        'created': time.time(),
+    }
+    tmp = f'{filename}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(json.dumps(header) + '\n')
+        for repo in plan.to_import:
+            f.write(json.dumps({'op': Journal.IMPORT, 'repo': repo}) + '\n')
+        for project in plan.to_delete:
+            f.write(json.dumps({
+                'op': Journal.DELETE, 'project': project.id,
+                'name': project.name,
+            }) + '\n')
+    os.replace(tmp, filename)
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(
-        description='Import repos from GitHub into Snyk',
+
+def read_plan(
+    filename: str, shard: Tuple[int, int] = (1, 1),
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    '''
+    The plan's header, and the operations in shard `k` of `n`: every `n`th
+    operation, starting from the `k`th.
+    '''
+    k, n = shard
+    with open(filename) as f:
+        header = json.loads(f.readline())
+        operations = [json.loads(line) for line in f if line.strip()]
+    return header, operations[k - 1::n]
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    try:
+        k, n = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected k/n, got {value!r}')
+    if not 1 <= k <= n:
+        raise argparse.ArgumentTypeError(f'shard {k} of {n} does not exist')
+    return k, n
+
+
+def main_plan(
+    owner: str,
+    org_name: str,
+    filename: str,
+    output: str,
+    max_rps: float = DEFAULT_MAX_RPS,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    cache_dir: Optional[str] = None,
+    shared_rate_limit: bool = False,
+) -> None:
+    '''Work out the changes to make, with read-only requests only.'''
+    snyk = make_snyk(
+        max_rps, max_retries, cache_dir, shared_rate_limit=shared_rate_limit,
+    )
+    org = find_org(snyk, org_name)
+    by_repo = index_by_repo(org.iter_projects(origin='github'))
+    logger.info(f'Loading data from {filename}')
+    plan = plan_changes(by_repo, load_repos(filename), owner)
+    write_plan(output, org, owner, plan)
+    logger.info(
+        f'Planned {len(plan.to_import)} imports and '
+        f'{len(plan.to_delete)} deletes in {output}'
+    )
+
+
+def main_apply(
+    plan_file: str,
+    shard: Tuple[int, int] = (1, 1),
+    workers: int = DEFAULT_WORKERS,
+    max_rps: float = DEFAULT_MAX_RPS,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    import_timeout: float = POLL_TIMEOUT,
+    journal_file: Optional[str] = None,
+    resume: bool = False,
+    shared_rate_limit: bool = False,
+) -> None:
+    '''
+    Carry out a shard of a plan. The plan holds the org and integration
+    ids, so nothing is fetched before the writes start.
+    '''
+    header, operations = read_plan(plan_file, shard)
+    snyk = make_snyk(
+        max_rps, max_retries, shared_rate_limit=shared_rate_limit,
+    )
+    org = Org(
+        snyk.client, header['org_name'], header['org'], None,
+        integrations={'github': header['integration']},
+    )
+    journal: Optional[Journal] = None
+    if journal_file:
+        k, n = shard
+        journal = open_journal(
+            journal_file, org.id, f'{file_hash(plan_file)}#{k}/{n}', resume,
+        )
+    repos = [op['repo'] for op in operations if op['op'] == Journal.IMPORT]
+    projects = [
+        Project(
+            snyk.client,
+            {'id': op['project'], 'name': op['name'], 'origin': 'github'},
+            org,
+        )
+        for op in operations if op['op'] == Journal.DELETE
+    ]
+    logger.info(
+        f'Applying shard {shard[0]}/{shard[1]} of {plan_file}: '
+        f'{len(repos)} imports, {len(projects)} deletes'
+    )
+    jobs = import_in_batches(
+        org, header['owner'], repos, batch_size, workers, journal,
+    )
+    if jobs:
+        logger.info(f'Waiting for {len(jobs)} import jobs to finish')
+        report_imports(wait_for_imports(
+            jobs, timeout=import_timeout, workers=workers,
+        ))
+    delete_projects(projects, workers, journal)
+    if journal is not None:
+        journal.finish()
+    log_connections(snyk)
+
+
+def connection_options() -> argparse.ArgumentParser:
+    '''Options for talking to the Snyk API, shared by every command.'''
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        '--max-rps',
+        help='Maximum Snyk API requests per second (0 for no limit)',
+        type=float,
+        default=DEFAULT_MAX_RPS,
     )
-    parser.add_argument('--owner', help='GitHub owner', required=True)
+    parser.add_argument(
+        '--shared-rate-limit',
+        help='Share --max-rps with other processes on this host using the '
+             'same token',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--max-retries',
+        help='Times to retry a throttled or failed Snyk API request',
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+    )
+    return parser
+
+
+def target_options() -> argparse.ArgumentParser:
+    '''Options naming what to reconcile, and the cache for reading it.'''
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--owner', help='GitHub owner')
     parser.add_argument(
         '--org',
         help='Name of Snyk organisation to import into',
-        required=True,
     )
     parser.add_argument(
         '--access-file',
         help='A JSON file containing config',
-        required=True,
     )
+    parser.add_argument(
+        '--cache-dir',
+        help='Directory to cache Snyk API responses in between runs',
+    )
+    return parser
+
+
+def work_options() -> argparse.ArgumentParser:
+    '''Options for carrying out imports and deletes.'''
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        '--workers',
+        help='Number of imports/deletes to run concurrently',
+        type=int,
+        default=DEFAULT_WORKERS,
+    )
+    parser.add_argument(
+        '--import-batch-size',
+        help='Number of repos to import per Snyk API request',
+        type=int,
+        default=IMPORT_BATCH_SIZE,
+    )
+    parser.add_argument(
+        '--import-timeout',
+        help='Seconds to wait for imports to finish before removing projects',
+        type=float,
+        default=POLL_TIMEOUT,
+    )
+    parser.add_argument(
+        '--journal',
+        help='File recording completed imports and deletes, for --resume',
+    )
+    parser.add_argument(
+        '--resume',
+        help='Skip operations the last interrupted run recorded as done',
+        action='store_true',
+    )
+    return parser
+
+
+def command_parser() -> argparse.ArgumentParser:
+    '''Parser for the `plan` and `apply` commands.'''
+    parser = argparse.ArgumentParser(
+        description='Plan changes to Snyk, then apply them',
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    plan = commands.add_parser(
+        'plan',
+        parents=[connection_options(), target_options()],
+        help='Write the imports and deletes to make to a plan file, using '
+             'read-only requests',
+    )
+    plan.add_argument(
+        '--output', help='Plan file to write', required=True,
+    )
+
+    apply = commands.add_parser(
+        'apply',
+        parents=[connection_options(), work_options()],
+        help='Carry out a plan file, or one shard of it',
+    )
+    apply.add_argument('plan_file', help='Plan file written by plan')
+    apply.add_argument(
+        '--shard',
+        help='Apply only shard k of n, e.g. 2/8',
+        type=parse_shard,
+        default=(1, 1),
+    )
+    return parser
+
+
+def run_command(argv: List[str]) -> None:
+    parser = command_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'plan':
+        if not (args.owner and args.org and args.access_file):
+            parser.error('--owner, --org and --access-file are required')
+        main_plan(
+            args.owner,
+            args.org,
+            args.access_file,
+            args.output,
+            max_rps=args.max_rps,
+            max_retries=args.max_retries,
+            cache_dir=args.cache_dir,
+            shared_rate_limit=args.shared_rate_limit,
+        )
+    else:
+        if args.resume and not args.journal:
+            parser.error('--resume requires --journal')
+        main_apply(
+            args.plan_file,
+            shard=args.shard,
+            workers=args.workers,
+            max_rps=args.max_rps,
+            max_retries=args.max_retries,
+            batch_size=args.import_batch_size,
+            import_timeout=args.import_timeout,
+            journal_file=args.journal,
+            resume=args.resume,
+            shared_rate_limit=args.shared_rate_limit,
+        )
+
+
+def main_parser() -> argparse.ArgumentParser:
+    '''Parser for a reconcile run, when no command is given.'''
+    parser = argparse.ArgumentParser(
+        description='Import repos from GitHub into Snyk. Run "%(prog)s plan '
+                    '-h" and "%(prog)s apply -h" to plan changes and apply '
+                    'them separately.',
+        parents=[connection_options(), target_options(), work_options()],
+    )
+    parser.add_argument(
+        '--watch',
+        help='Keep running, reconciling whenever the access file changes and '
+             'fully every --full-every hours',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--watch-interval',
+        help='Seconds between checks of the access file with --watch',
+        type=float,
+        default=DEFAULT_WATCH_INTERVAL,
+    )
+    parser.add_argument(
+        '--manifest',
+        help='A JSON file listing the owner, org and access file of each '
+             'org to reconcile, instead of --owner, --org and --access-file',
+    )
+    parser.add_argument(
+        '--org-workers',
+        help='Number of orgs to reconcile concurrently with --manifest',
+        type=int,
+        default=DEFAULT_ORG_WORKERS,
+    )
+    parser.add_argument(
+        '--stream',
+        help='Parse the access file incrementally, importing as it is read',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--metrics',
+        help='File to write request and phase metrics to at the end of the '
+             'run: a Prometheus textfile if it ends in .prom, JSON otherwise',
+    )
+    parser.add_argument(
+        '--profile',
+        help='Directory to write a cProfile .pstats file per phase to',
+    )
+    parser.add_argument(
+        '--profile-memory',
+        help='With --profile, also report the top allocations per phase',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--deadline',
+        help='Seconds the run may take: imports and deletes that would not '
+             'finish in time are postponed and reported',
+        type=float,
+    )
+    parser.add_argument(
+        '--first',
+        help='Which operations to run first with --deadline',
+        choices=[DELETES_FIRST, IMPORTS_FIRST],
+        default=DELETES_FIRST,
+    )
+    parser.add_argument(
+        '--state-dir',
+        help='Directory to keep a snapshot of the applied repos in, so later '
+             'runs only apply what changed in the access file',
+    )
+    parser.add_argument(
+        '--full-every',
+        help='Hours between full reconciles when using --state-dir',
+        type=float,
+        default=DEFAULT_FULL_EVERY,
+    )
+    return parser
+
+
+def check_args(
+    parser: argparse.ArgumentParser, args: argparse.Namespace,
+) -> None:
+    '''Exit with a usage error if the options cannot be used together.'''
+    if args.resume and not args.journal:
+        parser.error('--resume requires --journal')
+    if args.profile_memory and not args.profile:
+        parser.error('--profile-memory requires --profile')
+    if args.deadline is not None and (args.stream or args.watch):
+        parser.error('--deadline cannot be used with --stream or --watch')
+    if args.manifest:
+        if args.owner or args.org or args.access_file:
+            parser.error(
+                '--manifest cannot be used with --owner, --org or '
+                '--access-file'
+            )
+        if args.stream or args.watch:
+            parser.error('--manifest cannot be used with --stream or --watch')
+    elif not (args.owner and args.org and args.access_file):
+        parser.error(
+            'either --manifest or --owner, --org and --access-file are '
+            'required'
+        )
+
 
+if __name__ == '__main__':
+    if sys.argv[1:2] in (['plan'], ['apply']):
+        run_command(sys.argv[1:])
+        sys.exit(0)
+    parser = main_parser()
     args = parser.parse_args()
-    main(args.owner, args.org, args.access_file)
+    check_args(parser, args)
+    options = RunOptions.from_args(args)
+    if args.manifest:
+        sys.exit(1 if main_manifest(args.manifest, options) else 0)
+    stop = threading.Event()
+    if args.watch:
+        # Stop watching once the reconcile under way, if any, is done.
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    main(
+        args.owner,
+        args.org,
+        args.access_file,
+        options,
+        watch_interval=args.watch_interval if args.watch else None,
+        stop=stop,
+    )
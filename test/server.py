@@ -0,0 +1,139 @@
+import gzip
+import json
+import socket
+import socketserver
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Callable, Dict
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        responses = self.server.responses.get(self.path, [(404, {}, b'')])
+        status, headers, content = (
+            responses.pop(0) if len(responses) > 1 else responses[0]
+        )
+        self.server.requests.append(SimpleNamespace(
+            command=self.command,
+            path=self.path,
+            headers=self.headers,
+            body=body,
+        ))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_POST = do_DELETE = do_GET
+
+
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {
+    'gzip': gzip.compress,
+    'deflate': zlib.compress,
+}
+
+
+class LocalServer:
+    '''A local HTTP/1.1 server replaying canned responses by path.'''
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.responses = {}
+        self.server.requests = []
+        thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={'poll_interval': 0.01},
+        )
+        thread.daemon = True
+        thread.start()
+        host, port = self.server.server_address
+        self.url = f'http://{host}:{port}/api/'
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def respond(self, path, body, status=200, headers=None, encoding=None):
+        content = json.dumps(body).encode('utf-8')
+        headers = {'Content-Type': 'application/json', **(headers or {})}
+        if encoding is not None:
+            content = ENCODERS[encoding](content)
+            headers['Content-Encoding'] = encoding
+        self.server.responses.setdefault(path, []).append((
+            status, headers, content,
+        ))
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ProxyHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        head = b''
+        while b'\r\n\r\n' not in head:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+            head += chunk
+        self.server.requests.append(head.decode('latin-1'))
+        target = head.split()[1].decode('latin-1')
+        host, port = target.rsplit(':', 1)
+        with socket.create_connection((host, int(port))) as upstream:
+            self.request.sendall(
+                b'HTTP/1.1 200 Connection established\r\n\r\n',
+            )
+            copy = threading.Thread(
+                target=self.pipe, args=(upstream, self.request),
+            )
+            copy.daemon = True
+            copy.start()
+            self.pipe(self.request, upstream)
+            copy.join(1)
+
+    @staticmethod
+    def pipe(source, destination):
+        try:
+            for chunk in iter(lambda: source.recv(65536), b''):
+                destination.sendall(chunk)
+            destination.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+class LocalProxy:
+    '''A local proxy that only tunnels CONNECT requests.'''
+
+    def __init__(self):
+        self.server = socketserver.ThreadingTCPServer(
+            ('127.0.0.1', 0), ProxyHandler,
+        )
+        self.server.daemon_threads = True
+        self.server.requests = []
+        thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={'poll_interval': 0.01},
+        )
+        thread.daemon = True
+        thread.start()
+        host, port = self.server.server_address
+        self.url = f'http://user:secret@{host}:{port}'
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
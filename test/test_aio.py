@@ -0,0 +1,185 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+
+import snyk
+from snyk.aio import AsyncOrg, AsyncSnyk, TimedReader
+
+from server import LocalProxy, LocalServer
+
+
+class AsyncTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = LocalServer()
+        self.snyk = AsyncSnyk(
+            'token',
+            url=self.server.url,
+            timeout=1,
+            retry_policy=snyk.RetryPolicy(backoff=0),
+        )
+
+    async def asyncTearDown(self):
+        await self.snyk.close()
+
+    def tearDown(self):
+        self.server.close()
+
+
+class TestAsyncOrgs(AsyncTestCase):
+
+    async def test_orgs_share_group(self):
+        group = {'id': 'g1', 'name': 'FooGroup'}
+        self.server.respond('/api/orgs', {'orgs': [
+            {'id': '1', 'name': 'BarOrg', 'group': group},
+            {'id': '2', 'name': 'RabOrg', 'group': group},
+            {'id': '3', 'name': 'BOrg', 'group': None},
+        ]})
+
+        orgs = await self.snyk.orgs()
+
+        assert [org.name for org in orgs] == ['BarOrg', 'RabOrg', 'BOrg']
+        assert orgs[0].group is orgs[1].group
+        assert orgs[2].group is None
+
+    async def test_create_org(self):
+        self.server.respond('/api/group/1/org', {'id': 'o1', 'name': 'bar'})
+        group = snyk.aio.AsyncGroup(self.snyk.client, 'foo', '1')
+
+        org = await group.create_org('bar')
+
+        assert (org.id, org.group) == ('o1', group)
+
+
+class TestAsyncOrg(AsyncTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.org = AsyncOrg(self.snyk.client, 'foo', 'a1', None)
+        self.server.respond('/api/org/a1/integrations', {'github': 'gh'})
+        self.server.respond('/api/org/a1/integrations/gh/import', {})
+        self.server.respond('/api/org/a1/project/1', {})
+        self.server.respond('/api/org/a1/projects', {'projects': [
+            {
+                'id': '1',
+                'name': 'owner/build-lambda:requirements.txt',
+                'origin': 'github',
+            },
+            {'id': '2', 'name': 'jenkins:latest', 'origin': 'ecr'},
+        ]})
+
+    async def test_concurrent_imports_fetch_integrations_once(self):
+        await asyncio.gather(*(
+            self.org.import_github_project('owner', f'repo-{i}')
+            for i in range(20)
+        ))
+
+        paths = [request.path for request in self.server.requests]
+        assert paths.count('/api/org/a1/integrations') == 1
+        assert paths.count('/api/org/a1/integrations/gh/import') == 20
+        bodies = sorted(
+            json.loads(request.body)['target']['name']
+            for request in self.server.requests
+            if request.path.endswith('/import')
+        )
+        assert bodies == sorted(f'repo-{i}' for i in range(20))
+
+    async def test_projects(self):
+        projects = await self.org.projects
+
+        assert [p.repo_name for p in projects] == ['build-lambda', None]
+        assert await self.org.projects is projects
+
+    async def test_reloads_projects_after_cancelled_load(self):
+        self.org.projects
+        self.org._projects.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await self.org._projects
+
+        projects = await self.org.projects
+
+        assert [p.id for p in projects] == ['1', '2']
+
+    async def test_caller_timing_out_does_not_cancel_shared_load(self):
+        get_json = self.snyk.client.get_json
+
+        async def slow_get_json(path):
+            await asyncio.sleep(0.1)
+            return await get_json(path)
+
+        with patch.object(self.snyk.client, 'get_json', slow_get_json):
+            results = await asyncio.gather(
+                asyncio.wait_for(self.org.projects, 0.01),
+                self.org.projects,
+                return_exceptions=True,
+            )
+
+        assert isinstance(results[0], asyncio.TimeoutError)
+        assert [p.id for p in results[1]] == ['1', '2']
+
+    async def test_delete_project(self):
+        project = (await self.org.projects)[0]
+
+        await project.delete()
+
+        assert self.server.requests[-1].command == 'DELETE'
+
+    async def test_retries_server_errors(self):
+        self.server.server.responses['/api/org/a1/integrations'].insert(
+            0, (503, {}, b''),
+        )
+
+        assert await self.org.integrations == {'github': 'gh'}
+
+    async def test_reuses_connections(self):
+        for _ in range(3):
+            await self.snyk.client.get_json('org/a1/integrations')
+
+        assert self.snyk.client.connections_created == 1
+        assert self.snyk.client.connections_reused == 2
+
+
+class TestTimedReader(unittest.IsolatedAsyncioTestCase):
+
+    async def test_times_each_read_not_the_whole_body(self):
+        stream = asyncio.StreamReader()
+        reader = TimedReader(stream, 0.1)
+
+        async def trickle():
+            for _ in range(5):
+                await asyncio.sleep(0.04)
+                stream.feed_data(b'x' * 10)
+
+        feeding = asyncio.ensure_future(trickle())
+        assert await reader.readexactly(50) == b'x' * 50
+        await feeding
+
+    async def test_times_out_when_the_stream_stalls(self):
+        reader = TimedReader(asyncio.StreamReader(), 0.01)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await reader.readline()
+
+
+class TestAsyncClient(AsyncTestCase):
+
+    async def test_raises_on_redirect(self):
+        self.server.respond(
+            '/api/orgs', {}, status=302,
+            headers={'Location': 'https://example.com/api/orgs'},
+        )
+
+        with self.assertRaises(snyk.SnykRedirectError):
+            await self.snyk.client.get_json('orgs')
+
+    async def test_tunnels_through_proxy(self):
+        self.server.respond('/api/orgs', {'orgs': []})
+        proxy = LocalProxy()
+        self.addCleanup(proxy.close)
+
+        with patch.dict('os.environ', {'HTTP_PROXY': proxy.url}):
+            assert await self.snyk.client.get_json('orgs') == {'orgs': []}
+
+        [connect] = proxy.requests
+        assert connect.startswith('CONNECT 127.0.0.1:')
@@ -0,0 +1,157 @@
+import os
+import tempfile
+import unittest
+
+import snyk
+from snyk.cache import CacheEntry, ResponseCache
+
+from server import LocalServer
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCachedClient(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.clock = FakeClock()
+        self.cache = ResponseCache(
+            self.dir.name,
+            ttls={'orgs': 60, 'org/*/projects': 0},
+            clock=self.clock,
+        )
+        self.server = LocalServer()
+        self.client = snyk.HTTPClient(
+            self.server.url, 'token', 1, cache=self.cache,
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+        self.dir.cleanup()
+
+    def not_modified(self, path):
+        self.server.server.responses[path].append((304, {}, b''))
+
+    def test_serves_fresh_entries_without_a_request(self):
+        self.server.respond('/api/orgs', {'orgs': []})
+
+        self.client.get_json('orgs')
+        self.clock.now += 59
+
+        assert self.client.get_json('orgs') == {'orgs': []}
+        assert len(self.server.requests) == 1
+
+    def test_revalidates_with_etag(self):
+        self.server.respond(
+            '/api/org/a1/projects', {'projects': []}, headers={'ETag': '"v1"'},
+        )
+        self.not_modified('/api/org/a1/projects')
+
+        self.client.get_json('org/a1/projects')
+
+        assert self.client.get_json('org/a1/projects') == {'projects': []}
+        assert len(self.server.requests) == 2
+        assert self.server.requests[1].headers['If-None-Match'] == '"v1"'
+
+    def test_revalidates_with_last_modified(self):
+        modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        self.server.respond(
+            '/api/orgs', {'orgs': []}, headers={'Last-Modified': modified},
+        )
+        self.not_modified('/api/orgs')
+
+        self.client.get_json('orgs')
+        self.clock.now += 61
+
+        assert self.client.get_json('orgs') == {'orgs': []}
+        assert self.server.requests[1].headers['If-Modified-Since'] == (
+            modified
+        )
+
+    def test_revalidates_every_page_of_a_listing(self):
+        self.server.respond(
+            '/api/org/a1/projects?page=1', {'projects': []},
+            headers={'ETag': '"p1"'},
+        )
+        self.not_modified('/api/org/a1/projects?page=1')
+
+        self.client.get_json('org/a1/projects?page=1')
+
+        assert self.client.get_json('org/a1/projects?page=1') == {
+            'projects': [],
+        }
+        assert self.server.requests[1].headers['If-None-Match'] == '"p1"'
+
+    def test_does_not_cache_paths_without_ttl(self):
+        self.server.respond('/api/org/a1/integrations', {'github': 'gh'})
+
+        self.client.get_json('org/a1/integrations')
+        self.client.get_json('org/a1/integrations')
+
+        assert len(self.server.requests) == 2
+
+    def test_writes_to_an_org_drop_its_entries(self):
+        self.server.respond(
+            '/api/org/a1/projects', {'projects': []}, headers={'ETag': '"v1"'},
+        )
+        self.server.respond('/api/org/a1/project/1', {})
+        self.client.get_json('org/a1/projects')
+
+        self.client.delete('org/a1/project/1')
+        self.client.get_json('org/a1/projects')
+
+        assert 'If-None-Match' not in self.server.requests[2].headers
+
+    def test_read_only_queries_keep_entries(self):
+        self.server.respond(
+            '/api/org/a1/projects', {'projects': []}, headers={'ETag': '"v1"'},
+        )
+        self.client.get_json('org/a1/projects')
+
+        self.client.query_json('org/a1/projects', {'filters': {}})
+        self.client.get_json('org/a1/projects')
+
+        assert self.server.requests[2].headers['If-None-Match'] == '"v1"'
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_evicts_least_recently_used(self):
+        cache = ResponseCache(self.dir.name, max_bytes=600)
+        entry = CacheEntry(0, None, None, 'application/json', b'x' * 150)
+        cache.put('orgs', entry)
+        cache.put('org/a1/projects', entry)
+        os.utime(cache._file('orgs'), (0, 0))
+        os.utime(cache._file('org/a1/projects'), (1, 1))
+        cache.get('orgs')
+
+        cache.put('org/a2/projects', entry)
+
+        assert cache.get('org/a1/projects') is None
+        assert cache.get('orgs') is not None
+        assert cache.get('org/a2/projects') is not None
+
+    def test_invalidate_by_prefix(self):
+        cache = ResponseCache(self.dir.name)
+        entry = CacheEntry(0, None, None, 'application/json', b'{}')
+        cache.put('org/a1/projects', entry)
+        cache.put('org/a12/projects', entry)
+
+        cache.invalidate('org/a1/')
+
+        assert cache.get('org/a1/projects') is None
+        assert cache.get('org/a12/projects') is not None
@@ -0,0 +1,69 @@
+import gzip
+import io
+import unittest
+import zlib
+from http.client import HTTPResponse
+
+from snyk.encoding import Decoder, DecodingError, read_body
+
+
+BODY = b'{"projects": []}' * 1000
+
+
+def response(content, encoding=None):
+    headers = f'Content-Length: {len(content)}\r\n'
+    if encoding is not None:
+        headers += f'Content-Encoding: {encoding}\r\n'
+    raw = f'HTTP/1.1 200 OK\r\n{headers}\r\n'.encode('ascii') + content
+
+    class Socket:
+        def makefile(self, mode):
+            return io.BytesIO(raw)
+
+    response = HTTPResponse(Socket())
+    response.begin()
+    return response
+
+
+class TestReadBody(unittest.TestCase):
+
+    def test_plain(self):
+        assert read_body(response(BODY)) == (BODY, len(BODY))
+
+    def test_gzip(self):
+        content = gzip.compress(BODY)
+
+        assert read_body(response(content, 'gzip')) == (BODY, len(content))
+
+    def test_deflate(self):
+        content = zlib.compress(BODY)
+
+        assert read_body(response(content, 'deflate')) == (BODY, len(content))
+
+    def test_raw_deflate(self):
+        compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        content = compressor.compress(BODY) + compressor.flush()
+
+        assert read_body(response(content, 'Deflate')) == (BODY, len(content))
+
+    def test_unsupported_encoding(self):
+        with self.assertRaises(DecodingError):
+            read_body(response(BODY, 'br'))
+
+    def test_corrupt_body(self):
+        with self.assertRaises(DecodingError):
+            read_body(response(b'not gzip', 'gzip'))
+
+
+class TestDecoder(unittest.TestCase):
+
+    def test_decompresses_a_chunk_at_a_time(self):
+        content = gzip.compress(BODY)
+        decoder = Decoder('gzip')
+
+        decoded = b''.join(
+            decoder.decompress(content[i:i + 100])
+            for i in range(0, len(content), 100)
+        ) + decoder.flush()
+
+        assert decoded == BODY
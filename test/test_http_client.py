@@ -0,0 +1,289 @@
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.client import RemoteDisconnected
+from unittest.mock import MagicMock, patch
+
+import snyk
+
+from server import LocalProxy, LocalServer
+
+
+class LocalServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.local = LocalServer()
+        self.server = self.local.server
+        self.respond = self.local.respond
+        self.client = snyk.HTTPClient(self.local.url, 'token', 1)
+
+    def tearDown(self):
+        self.client.close()
+        self.local.close()
+
+
+class TestConnectionPool(LocalServerTestCase):
+
+    def test_reuses_connection_between_requests(self):
+        self.respond('/api/orgs', {'orgs': []})
+
+        for _ in range(3):
+            assert self.client.get_json('orgs') == {'orgs': []}
+
+        assert self.client.pool.created == 1
+        assert self.client.pool.reused == 2
+
+    def test_reconnects_when_server_closed_idle_connection(self):
+        self.respond('/api/orgs', {'orgs': []})
+        self.client.get_json('orgs')
+        for conns in self.client.pool._idle.values():
+            for conn in conns:
+                conn.request = MagicMock(side_effect=RemoteDisconnected())
+
+        assert self.client.get_json('orgs') == {'orgs': []}
+        assert self.client.pool.created == 2
+
+    def test_raises_on_http_error(self):
+        self.respond('/api/orgs', {'message': 'nope'}, status=403)
+
+        with self.assertRaises(snyk.SnykHTTPError) as cm:
+            self.client.get_json('orgs')
+
+        assert cm.exception.status == 403
+        assert len(self.server.requests) == 1
+
+    def test_coalesces_concurrent_gets(self):
+        self.respond('/api/orgs', {'orgs': []})
+        request = self.client.request
+        release = threading.Event()
+
+        def slow_request(*args, **kwargs):
+            release.wait(1)
+            return request(*args, **kwargs)
+
+        self.client.request = MagicMock(side_effect=slow_request)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [
+                executor.submit(self.client.get_json, 'orgs')
+                for _ in range(4)
+            ]
+            time.sleep(0.05)
+            release.set()
+        results = [future.result() for future in futures]
+
+        assert results == [{'orgs': []}] * 4
+        assert results[0] is not results[1]
+        assert self.client.request.call_count == 1
+
+    def test_asks_for_compressed_responses(self):
+        self.respond('/api/orgs', {'orgs': []})
+
+        self.client.get_json('orgs')
+
+        [request] = self.server.requests
+        assert request.headers['Accept-Encoding'] == 'gzip, deflate'
+
+    def test_decompresses_responses(self):
+        orgs = {'orgs': [{'name': f'org-{i}'} for i in range(100)]}
+        self.respond('/api/orgs', orgs, encoding='gzip')
+        self.respond('/api/orgs', orgs, encoding='deflate')
+
+        assert self.client.get_json('orgs') == orgs
+        assert self.client.get_json('orgs') == orgs
+        assert self.client.bytes_decoded == 2 * len(json.dumps(orgs))
+        assert self.client.bytes_received < self.client.bytes_decoded / 4
+
+    def test_does_not_retry_undecodable_responses(self):
+        self.respond('/api/orgs', {}, headers={'Content-Encoding': 'br'})
+
+        with self.assertRaises(snyk.SnykError):
+            self.client.get_json('orgs')
+        assert len(self.server.requests) == 1
+
+    def test_raises_on_redirect(self):
+        self.respond(
+            '/api/orgs', {}, status=301,
+            headers={'Location': 'https://example.com/api/orgs'},
+        )
+
+        with self.assertRaises(snyk.SnykRedirectError) as cm:
+            self.client.get_json('orgs')
+
+        assert 'https://example.com/api/orgs' in str(cm.exception)
+        assert len(self.server.requests) == 1
+
+    def test_tunnels_through_proxy(self):
+        self.respond('/api/orgs', {'orgs': []})
+        proxy = LocalProxy()
+        self.addCleanup(proxy.close)
+
+        with patch.dict('os.environ', {'HTTP_PROXY': proxy.url}):
+            assert self.client.get_json('orgs') == {'orgs': []}
+
+        [connect] = proxy.requests
+        assert connect.startswith('CONNECT 127.0.0.1:')
+        assert 'Proxy-Authorization: Basic dXNlcjpzZWNyZXQ=' in connect
+
+    def test_no_proxy_bypasses_proxy(self):
+        self.respond('/api/orgs', {'orgs': []})
+        proxy = LocalProxy()
+        self.addCleanup(proxy.close)
+
+        with patch.dict('os.environ', {
+            'HTTP_PROXY': proxy.url, 'NO_PROXY': '127.0.0.1',
+        }):
+            assert self.client.get_json('orgs') == {'orgs': []}
+
+        assert proxy.requests == []
+
+    def test_snyk_shares_one_client(self):
+        s = snyk.Snyk('token', url='http://snyk')
+
+        assert s.client is s.client
+
+
+class TestRetries(LocalServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sleeps = []
+        self.client.retry_policy = snyk.RetryPolicy(
+            max_retries=3,
+            backoff=1,
+            budget=100,
+            jitter=lambda: 1.0,
+            sleep=self.sleeps.append,
+        )
+
+    def test_retries_server_errors_with_exponential_backoff(self):
+        self.respond('/api/orgs', {}, status=502)
+        self.respond('/api/orgs', {}, status=503)
+        self.respond('/api/orgs', {'orgs': []})
+
+        assert self.client.get_json('orgs') == {'orgs': []}
+        assert self.sleeps == [1, 2]
+
+    def test_honours_retry_after(self):
+        self.respond('/api/orgs', {}, status=429, headers={'Retry-After': '7'})
+        self.respond('/api/orgs', {'orgs': []})
+
+        self.client.get_json('orgs')
+
+        assert self.sleeps == [7]
+
+    def test_honours_exhausted_rate_limit_reset(self):
+        self.respond('/api/orgs', {}, status=429, headers={
+            'X-RateLimit-Remaining': '0',
+            'X-RateLimit-Reset': '3',
+        })
+        self.respond('/api/orgs', {'orgs': []})
+
+        self.client.get_json('orgs')
+
+        assert self.sleeps == [3]
+
+    def test_gives_up_after_max_retries(self):
+        self.respond('/api/orgs', {}, status=500)
+
+        with self.assertRaises(snyk.SnykHTTPError):
+            self.client.get_json('orgs')
+
+        assert len(self.server.requests) == 4
+
+    def test_gives_up_when_budget_is_spent(self):
+        self.client.retry_policy.budget = 2
+        self.respond('/api/orgs', {}, status=500)
+
+        with self.assertRaises(snyk.SnykHTTPError):
+            self.client.get_json('orgs')
+
+        assert self.sleeps == [1]
+
+    def test_does_not_wait_past_the_deadline(self):
+        policy = self.client.retry_policy
+        policy.deadline, policy.clock = 10.0, lambda: 5.0
+        self.respond('/api/orgs', {}, status=429, headers={'Retry-After': '4'})
+        self.respond('/api/orgs', {}, status=429, headers={'Retry-After': '6'})
+        self.respond('/api/orgs', {'orgs': []})
+
+        with self.assertRaises(snyk.SnykHTTPError):
+            self.client.get_json('orgs')
+
+        assert self.sleeps == [4]
+
+    def test_does_not_wait_for_the_rate_limiter_past_the_deadline(self):
+        policy = self.client.retry_policy
+        policy.deadline, policy.clock = 10.0, lambda: 5.0
+        limiter = snyk.TokenBucket(1, clock=lambda: 0.0)
+        limiter.throttle(30)
+        self.client.rate_limiter = limiter
+
+        with self.assertRaises(snyk.SnykError):
+            self.client.get_json('orgs')
+
+        assert self.server.requests == []
+
+    def test_throttling_slows_the_shared_rate_limiter(self):
+        limiter = MagicMock(spec=snyk.TokenBucket)
+        self.client.rate_limiter = limiter
+        self.respond('/api/orgs', {}, status=429, headers={'Retry-After': '2'})
+        self.respond('/api/orgs', {'orgs': []})
+
+        self.client.get_json('orgs')
+
+        limiter.throttle.assert_called_once_with(2)
+        assert self.sleeps == []
+
+    def test_does_not_retry_failed_imports(self):
+        self.respond('/api/org/1/integrations/gh/import', {}, status=500)
+
+        with self.assertRaises(snyk.SnykHTTPError):
+            self.client.post_json('org/1/integrations/gh/import', {})
+
+        assert len(self.server.requests) == 1
+
+    def test_retries_throttled_imports(self):
+        self.respond('/api/org/1/integrations/gh/import', {}, status=503)
+        self.respond('/api/org/1/integrations/gh/import', {})
+
+        self.client.post_json('org/1/integrations/gh/import', {})
+
+        assert len(self.server.requests) == 2
+
+    def test_retries_imports_only_if_never_sent(self):
+        response = snyk.Response(201, {}, b'{}')
+        path = 'org/1/integrations/gh/import'
+        with patch.object(self.client, '_send', side_effect=[
+            snyk.RequestNotSentError('refused'), response,
+        ]):
+            assert self.client.post_json(path, {}) == {}
+        with patch.object(self.client, '_send', side_effect=[
+            TimeoutError('timed out'), response,
+        ]):
+            with self.assertRaises(TimeoutError):
+                self.client.post_json(path, {})
+
+    def test_connection_refused_is_not_sent(self):
+        client = snyk.HTTPClient(
+            'http://127.0.0.1:1/api/', 'token', 1,
+            retry_policy=snyk.RetryPolicy(max_retries=0),
+        )
+
+        with self.assertRaises(snyk.RequestNotSentError):
+            client.post_json('org/1/integrations/gh/import', {})
+
+    def test_retried_delete_that_already_succeeded(self):
+        self.respond('/api/org/1/project/2', {}, status=502)
+        self.respond('/api/org/1/project/2', {}, status=404)
+
+        self.client.delete('org/1/project/2')
+
+        assert len(self.server.requests) == 2
+
+    def test_delete_of_missing_project_fails(self):
+        self.respond('/api/org/1/project/2', {}, status=404)
+
+        with self.assertRaises(snyk.SnykHTTPError):
+            self.client.delete('org/1/project/2')
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import MagicMock
+
+import snyk
+from snyk.imports import ImportJob, wait_for_imports
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def job_status(status, logs=()):
+    return {
+        'id': 'job',
+        'status': status,
+        'logs': [
+            {'name': f'owner/{repo}', 'status': log_status}
+            for repo, log_status in logs
+        ],
+    }
+
+
+class TestWaitForImports(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def job(self, repos, *statuses):
+        client = MagicMock(spec=snyk.HTTPClient)
+        client.get_json.side_effect = list(statuses)
+        return ImportJob(client, 'http://snyk/job', repos, clock=self.clock)
+
+    def wait(self, jobs, **kwargs):
+        return wait_for_imports(
+            jobs, clock=self.clock, sleep=self.clock.sleep, **kwargs,
+        )
+
+    def test_reports_success_and_failure_per_repo(self):
+        job = self.job(
+            ['repo-a', 'repo-b'],
+            job_status('pending', [('repo-a', 'complete')]),
+            job_status('complete', [
+                ('repo-a', 'complete'), ('repo-b', 'failed'),
+            ]),
+        )
+
+        results = self.wait([job], interval=2)
+
+        assert [tuple(result) for result in results] == [
+            ('repo-a', True, 'complete', 0.0),
+            ('repo-b', False, 'failed', 2.0),
+        ]
+
+    def test_backs_off_between_polls(self):
+        job = self.job(
+            ['repo-a'],
+            job_status('pending'),
+            job_status('pending'),
+            job_status('pending'),
+            job_status('complete'),
+        )
+
+        self.wait([job], interval=1)
+
+        assert self.clock.now == 7
+        assert job.client.get_json.call_count == 4
+
+    def test_reports_unfinished_jobs_as_pending_at_timeout(self):
+        job = self.job(['repo-a'], *[job_status('pending')] * 10)
+
+        results = self.wait([job], interval=1, timeout=5)
+
+        assert results[0].status == 'pending'
+        assert not results[0].success
+        assert self.clock.now == 5
+
+    def test_fails_repos_of_jobs_that_cannot_be_polled(self):
+        good = self.job(['repo-a'], job_status('complete', [
+            ('repo-a', 'complete'),
+        ]))
+        expired = self.job(['repo-b', 'repo-c'], snyk.SnykError('gone'))
+
+        results = self.wait([good, expired])
+
+        assert [(r.repo, r.success, r.status) for r in results] == [
+            ('repo-a', True, 'complete'),
+            ('repo-b', False, 'failed (gone)'),
+            ('repo-c', False, 'failed (gone)'),
+        ]
@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+import unittest
+
+import snyk
+from snyk.metrics import Metrics, endpoint_template, percentile
+
+from server import LocalServer
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestEndpointTemplate(unittest.TestCase):
+
+    def test_replaces_ids(self):
+        assert endpoint_template('org/42/projects') == 'org/{id}/projects'
+        assert endpoint_template('org/42/project/abc') == (
+            'org/{id}/project/{id}'
+        )
+        assert endpoint_template('orgs') == 'orgs'
+
+    def test_strips_api_url_from_import_jobs(self):
+        assert endpoint_template(
+            'https://snyk.io/api/v1/org/42/integrations/7/import/99',
+        ) == 'org/{id}/integrations/{id}/import/{id}'
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.metrics = Metrics(clock=self.clock)
+
+    def test_percentiles(self):
+        latencies = [float(i) for i in range(1, 101)]
+
+        assert percentile(latencies, 0.5) == 50
+        assert percentile(latencies, 0.99) == 99
+        assert percentile([], 0.5) == 0
+
+    def test_summarises_requests_by_endpoint(self):
+        for i in range(4):
+            self.metrics.record_request(
+                'GET', f'org/{i}/projects', '200', 0.1 * (i + 1),
+                bytes_received=10, retry=i == 3,
+            )
+
+        [endpoint] = self.metrics.summary()['endpoints']
+
+        assert endpoint['endpoint'] == 'org/{id}/projects'
+        assert endpoint['requests'] == 4
+        assert endpoint['statuses'] == {'200': 4}
+        assert endpoint['retries'] == 1
+        assert endpoint['bytes_received'] == 40
+        assert endpoint['p50'] == 0.2
+
+    def test_phases_add_up(self):
+        for _ in range(2):
+            with self.metrics.phase('imports'):
+                self.clock.now += 1.5
+
+        assert self.metrics.summary()['phases'] == {'imports': 3.0}
+
+    def test_prometheus_textfile(self):
+        self.metrics.record_request('DELETE', 'org/1/project/2', '500', 1.0)
+        with self.metrics.phase('deletes'):
+            self.clock.now += 2
+
+        text = self.metrics.prometheus()
+
+        assert (
+            'snyk_access_requests_total{method="DELETE",'
+            'endpoint="org/{id}/project/{id}",status="500"} 1'
+        ) in text.splitlines()
+        assert (
+            'snyk_access_phase_duration_seconds{phase="deletes"} 2.0'
+        ) in text.splitlines()
+
+    def test_writes_json_or_prometheus_by_extension(self):
+        self.metrics.record_request('GET', 'orgs', '200', 1.0)
+        with tempfile.TemporaryDirectory() as dir:
+            self.metrics.write(os.path.join(dir, 'metrics.json'))
+            self.metrics.write(os.path.join(dir, 'metrics.prom'))
+
+            with open(os.path.join(dir, 'metrics.json')) as f:
+                assert json.load(f)['endpoints'][0]['endpoint'] == 'orgs'
+            with open(os.path.join(dir, 'metrics.prom')) as f:
+                assert f.read().startswith('# HELP')
+
+
+class TestHTTPClientMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.local = LocalServer()
+        self.metrics = Metrics()
+        self.client = snyk.HTTPClient(
+            self.local.url, 'token', 1,
+            retry_policy=snyk.RetryPolicy(sleep=lambda seconds: None),
+            metrics=self.metrics,
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.local.close()
+
+    def test_records_each_attempt(self):
+        self.local.respond('/api/org/42/projects', {'error': 'oops'}, 500)
+        self.local.respond('/api/org/42/projects', {'projects': []})
+
+        self.client.get_json('org/42/projects')
+
+        [endpoint] = self.metrics.summary()['endpoints']
+        assert endpoint['method'] == 'GET'
+        assert endpoint['statuses'] == {'500': 1, '200': 1}
+        assert endpoint['retries'] == 1
+        assert endpoint['bytes_received'] > 0
+
+    def test_records_compressed_and_decoded_bytes(self):
+        projects = {'projects': [{'name': 'owner/repo'}] * 100}
+        self.local.respond('/api/org/42/projects', projects, encoding='gzip')
+
+        self.client.get_json('org/42/projects')
+
+        [endpoint] = self.metrics.summary()['endpoints']
+        assert endpoint['bytes_decoded'] == len(json.dumps(projects))
+        assert endpoint['bytes_received'] < endpoint['bytes_decoded']
@@ -1,9 +1,13 @@
 import json
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
 
 import httpretty
 
 import snyk
+from snyk.cache import ResponseCache
 
 
 class TestOrgs(unittest.TestCase):
@@ -43,8 +47,8 @@ class TestOrgs(unittest.TestCase):
                 'Content-Type': 'application/json',
             },
         )
-        s = snyk.Snyk('token', url=base_url)
-        self.orgs = s.orgs()
+        self.snyk = snyk.Snyk('token', url=base_url)
+        self.orgs = self.snyk.orgs()
 
     def tearDown(self):
         httpretty.disable()
@@ -64,6 +68,38 @@ class TestOrgs(unittest.TestCase):
     def test_org_group_id(self):
         assert self.orgs[0].group.id == 'aaaaaaaa-badd-cccc-b463-eeeeeeeeeeee'
 
+    def test_orgs_in_a_group_share_it(self):
+        assert self.orgs[0].group is self.orgs[1].group
+
+    def test_org_lookup_by_name_and_id(self):
+        assert self.snyk.org('RabOrg') is self.orgs[1]
+        assert self.snyk.org('iiiiiiii-bbbb-4172-dddd-aaaaaaaaaaaa') is (
+            self.orgs[2]
+        )
+
+    def test_orgs_are_memoized(self):
+        with patch.object(self.snyk.client, 'get_json') as get_json:
+            self.snyk.orgs()
+            self.snyk.org('BOrg')
+
+        get_json.assert_not_called()
+
+    def test_org_lookup_skips_the_lock_once_loaded(self):
+        self.snyk.orgs()
+        self.snyk._orgs_lock = MagicMock()
+
+        assert self.snyk.org('BOrg').name == 'BOrg'
+        self.snyk._orgs_lock.__enter__.assert_not_called()
+
+    def test_refresh_orgs(self):
+        with patch.object(self.snyk.client, 'get_json') as get_json:
+            get_json.return_value = {'orgs': []}
+            self.snyk.refresh_orgs()
+
+            assert self.snyk.orgs() == []
+
+        get_json.assert_called_once_with('orgs')
+
 
 class TestImportProjects(unittest.TestCase):
 
@@ -112,6 +148,44 @@ class TestImportProjects(unittest.TestCase):
         assert request.parsed_body['target']['name'] == 'name'
         assert request.parsed_body['target']['branch'] == 'master'
 
+    def test_import_github_projects_in_batches(self):
+        self.org.integrations
+        with patch.object(self.org.client, 'request') as request:
+            request.return_value.headers = {'Location': 'http://snyk/job'}
+            jobs = self.org.import_github_projects(
+                [('owner', f'name-{i}', 'master') for i in range(5)],
+                batch_size=2,
+            )
+
+        bodies = [c.args[2] for c in request.call_args_list]
+        assert [len(body['targets']) for body in bodies] == [2, 2, 1]
+        assert bodies[-1]['targets'] == [
+            {'owner': 'owner', 'name': 'name-4', 'branch': 'master'},
+        ]
+        assert request.call_args.args[:2] == (
+            'POST',
+            'org/a1/integrations/aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee/import',
+        )
+        assert [job.repos for job in jobs] == [
+            ['name-0', 'name-1'], ['name-2', 'name-3'], ['name-4'],
+        ]
+
+    def test_concurrent_imports_fetch_integrations_once(self):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for future in [
+                executor.submit(
+                    self.org.import_github_project, 'owner', f'repo-{i}',
+                )
+                for i in range(8)
+            ]:
+                future.result()
+
+        integration_requests = [
+            request for request in httpretty.latest_requests()
+            if request.path.endswith('/integrations')
+        ]
+        assert len(integration_requests) == 1
+
 
 class TestListProjects(unittest.TestCase):
 
@@ -191,6 +265,7 @@ class TestListProjects(unittest.TestCase):
             'a1',
             snyk.Group(client, 'foo', '1'),
         )
+        self.org = org
         self.projects = org.projects
 
     def tearDown(self):
@@ -204,3 +279,64 @@ class TestListProjects(unittest.TestCase):
 
     def test_project_id(self):
         assert self.projects[0].id == '1'
+
+    def test_projects_by_repo(self):
+        assert self.org.projects_by_repo == {
+            'owner/team-metadata-sync': [self.projects[0]],
+            'owner/build-lambda': [self.projects[1]],
+        }
+
+
+class TestIterProjects(unittest.TestCase):
+
+    def setUp(self):
+        self.client = snyk.HTTPClient('http://snyk', 'token', 1)
+        self.org = snyk.Org(self.client, 'foo', 'a1', None)
+
+    def page(self, *ids, next=None):
+        data = {'projects': [
+            {'id': id, 'name': f'owner/repo-{id}:pom.xml', 'origin': 'github'}
+            for id in ids
+        ]}
+        if next:
+            data['links'] = {'next': next}
+        return data
+
+    def test_filters_on_the_server(self):
+        with patch.object(self.client, 'query_json') as query_json:
+            query_json.return_value = self.page('1')
+
+            projects = list(self.org.iter_projects(origin='github'))
+
+        query_json.assert_called_once_with(
+            'org/a1/projects', {'filters': {'origin': 'github'}},
+        )
+        assert [p.repo_name for p in projects] == ['repo-1']
+
+    def test_filters_cached_listings_locally(self):
+        with tempfile.TemporaryDirectory() as dir:
+            self.client.cache = ResponseCache(dir)
+            page = self.page('1', '2')
+            page['projects'][1]['origin'] = 'ecr'
+            with patch.object(self.client, 'get_json') as get_json:
+                get_json.return_value = page
+
+                projects = list(self.org.iter_projects(origin='github'))
+
+        get_json.assert_called_once_with('org/a1/projects')
+        assert [p.id for p in projects] == ['1']
+
+    def test_follows_pagination(self):
+        with patch.object(self.client, 'get_json') as get_json:
+            get_json.side_effect = [
+                self.page('1', '2', next='org/a1/projects?page=2'),
+                self.page('3'),
+            ]
+
+            projects = self.org.iter_projects()
+
+            assert next(projects).id == '1'
+            get_json.assert_called_once_with('org/a1/projects')
+            assert [p.id for p in projects] == ['2', '3']
+
+        get_json.assert_called_with('org/a1/projects?page=2')
@@ -0,0 +1,63 @@
+import os
+import pstats
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from snyk.profiling import Profiler
+
+
+def busy_work(n):
+    return sum(i * i for i in range(n))
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def stats(self, phase):
+        return pstats.Stats(os.path.join(self.dir.name, f'{phase}.pstats'))
+
+    def profiled_functions(self, phase):
+        return {name for _, _, name in self.stats(phase).stats}
+
+    def test_writes_stats_per_phase(self):
+        profiler = Profiler(self.dir.name)
+        with profiler.phase('load_file'):
+            busy_work(1000)
+        with profiler.phase('deletes'):
+            pass
+        profiler.close()
+
+        assert 'busy_work' in self.profiled_functions('load_file')
+        assert 'busy_work' not in self.profiled_functions('deletes')
+
+    def test_wrapped_calls_in_other_threads_count_towards_phase(self):
+        profiler = Profiler(self.dir.name)
+        with profiler.phase('imports'):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                list(executor.map(profiler.wrap(busy_work), [100] * 4))
+        profiler.close()
+
+        stats = self.stats('imports').stats
+        [calls] = [
+            stat[1] for (_, _, name), stat in stats.items()
+            if name == 'busy_work'
+        ]
+        assert calls == 4
+
+    def test_reports_allocations_per_phase(self):
+        profiler = Profiler(self.dir.name, memory=True)
+        with profiler.phase('list_projects'):
+            projects = [{'id': str(i)} for i in range(1000)]
+        profiler.close()
+
+        with open(os.path.join(self.dir.name, 'list_projects.alloc.txt')) as f:
+            report = f.read()
+        assert report.startswith('# list_projects:')
+        assert 'test_profiling.py' in report
+        assert len(projects) == 1000
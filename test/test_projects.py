@@ -10,6 +10,14 @@ class TestProject(unittest.TestCase):
     def setUp(self):
         httpretty.enable(allow_net_connect=False)
         base_url = 'http://snyk'
+        httpretty.register_uri(
+            httpretty.GET,
+            base_url + '/org/a1/project/42',
+            body='{"id": "42", "type": "pip", "totalDependencies": 16}',
+            adding_headers={
+                'Content-Type': 'application/json',
+            },
+        )
         httpretty.register_uri(
             httpretty.DELETE,
             base_url + '/org/a1/project/42',
@@ -56,3 +64,11 @@ class TestProject(unittest.TestCase):
 
     def test_repo_name(self):
         assert self.project.repo_name == 'p-foo'
+
+    def test_keeps_only_used_fields(self):
+        assert not hasattr(self.project, '__dict__')
+        assert self.project.origin == 'github'
+
+    def test_loads_attrs_on_demand(self):
+        assert self.project.attrs['totalDependencies'] == 16
+        assert httpretty.last_request().method == httpretty.GET
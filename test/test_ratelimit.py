@@ -0,0 +1,174 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from snyk.ratelimit import (
+    FileTokenBucket, RateLimitTimeout, TokenBucket, state_file,
+)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(
+            2, capacity=2, clock=self.clock, sleep=self.clock.sleep,
+        )
+
+    def test_allows_burst_up_to_capacity(self):
+        assert self.bucket.reserve() == 0
+        assert self.bucket.reserve() == 0
+
+    def test_waits_once_bucket_is_empty(self):
+        self.bucket.reserve()
+        self.bucket.reserve()
+
+        assert self.bucket.reserve() == 0.5
+        assert self.bucket.reserve() == 1.0
+
+    def test_refills_over_time(self):
+        self.bucket.reserve()
+        self.bucket.reserve()
+        self.clock.now += 0.5
+
+        assert self.bucket.reserve() == 0
+
+    def test_acquire_paces_requests_at_rate(self):
+        for _ in range(6):
+            self.bucket.acquire()
+
+        assert self.clock.now == 2.0
+
+    def test_rejects_non_positive_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+    def test_throttle_halves_rate_and_pauses_callers(self):
+        self.bucket.throttle(3)
+
+        assert self.bucket.rate == 1
+        assert self.bucket.reserve() == 4
+
+    def test_concurrent_throttles_overlap(self):
+        bucket = TokenBucket(
+            4, capacity=4, clock=self.clock, sleep=self.clock.sleep,
+        )
+        for _ in range(4):
+            bucket.reserve()
+        barrier = threading.Barrier(4)
+
+        def throttle():
+            barrier.wait()
+            bucket.throttle(10)
+
+        threads = [threading.Thread(target=throttle) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert bucket.rate == 2
+        assert bucket.wait_time() == 10.5
+
+    def test_throttles_after_the_pause_halve_again(self):
+        self.bucket.throttle(1)
+        self.clock.now += 2
+        self.bucket.throttle(1)
+
+        assert self.bucket.rate == 0.5
+
+    def test_reserve_gives_up_past_timeout_without_taking_tokens(self):
+        self.bucket.throttle(3)
+
+        with self.assertRaises(RateLimitTimeout):
+            self.bucket.reserve(timeout=2)
+        assert self.bucket.reserve() == 4
+
+    def test_recover_restores_rate_gradually(self):
+        self.bucket.throttle()
+        for _ in range(100):
+            self.bucket.recover()
+
+        assert self.bucket.rate == 2
+
+    def test_wait_time_does_not_take_tokens(self):
+        self.bucket.reserve()
+        self.bucket.reserve()
+
+        assert self.bucket.wait_time() == 0.5
+        assert self.bucket.wait_time() == 0.5
+
+
+class TestFileTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'bucket.json')
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def bucket(self):
+        return FileTokenBucket(
+            2, self.filename, capacity=2,
+            clock=self.clock, sleep=self.clock.sleep,
+        )
+
+    def test_buckets_on_one_file_share_tokens(self):
+        first, second = self.bucket(), self.bucket()
+
+        assert first.reserve() == 0
+        assert second.reserve() == 0
+        assert first.reserve() == 0.5
+        assert second.wait_time() == 1.0
+
+    def test_throttle_slows_every_bucket(self):
+        first, second = self.bucket(), self.bucket()
+
+        first.throttle(3)
+
+        assert second.reserve() == 4
+        assert second.rate == 1
+
+    def test_starts_full_from_unreadable_file(self):
+        with open(self.filename, 'w') as f:
+            f.write('{"tok')
+
+        assert self.bucket().reserve() == 0
+
+    def test_creates_state_file_for_this_user_only(self):
+        self.bucket().reserve()
+
+        assert os.stat(self.filename).st_mode & 0o777 == 0o600
+
+    def test_refuses_symlinked_state_file(self):
+        target = os.path.join(self.dir.name, 'target')
+        os.symlink(target, self.filename)
+
+        with self.assertRaises(OSError):
+            self.bucket().reserve()
+        assert not os.path.exists(target)
+
+    def test_refuses_state_file_owned_by_another_user(self):
+        with patch('os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(PermissionError):
+                self.bucket().reserve()
+
+    def test_state_file_depends_on_token(self):
+        assert state_file('a') == state_file('a')
+        assert state_file('a') != state_file('b')
@@ -0,0 +1,89 @@
+import unittest
+
+from snyk.schedule import Operation, Scheduler
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.ran = []
+
+    def scheduler(self, deadline):
+        return Scheduler(
+            deadline, workers=1, initial_estimate=1, clock=self.clock,
+        )
+
+    def handler(self, seconds):
+        def run(item):
+            self.ran.append(item)
+            self.clock.now += seconds
+        return run
+
+    def test_runs_in_priority_order(self):
+        postponed, _ = self.scheduler(100).run(
+            [
+                Operation(1, 'import', 'a'),
+                Operation(0, 'delete', 'x'),
+                Operation(1, 'import', 'b'),
+            ],
+            {'import': self.handler(1), 'delete': self.handler(1)},
+        )
+
+        assert self.ran == ['x', 'a', 'b']
+        assert postponed == []
+
+    def test_postpones_what_would_overrun_the_deadline(self):
+        postponed, _ = self.scheduler(5).run(
+            [Operation(0, 'delete', str(i)) for i in range(5)],
+            {'delete': self.handler(2)},
+        )
+
+        assert self.ran == ['0', '1']
+        assert [operation.item for operation in postponed] == ['2', '3', '4']
+
+    def test_postponed_work_does_not_block_cheaper_work(self):
+        postponed, _ = self.scheduler(4).run(
+            [Operation(0, 'delete', 'x'), Operation(0, 'delete', 'y'),
+             Operation(1, 'import', 'a')],
+            {'import': self.handler(1), 'delete': self.handler(3)},
+        )
+
+        assert self.ran == ['x', 'a']
+        assert [operation.item for operation in postponed] == ['y']
+
+    def test_failed_operations_do_not_stop_the_rest(self):
+        error = ValueError('boom')
+
+        def fail(item):
+            raise error
+
+        scheduler = Scheduler(100, workers=2, clock=self.clock)
+        postponed, failed = scheduler.run(
+            [Operation(0, 'import', str(i)) for i in range(3)] +
+            [Operation(1, 'delete', str(i)) for i in range(4)],
+            {'import': fail, 'delete': self.handler(0)},
+        )
+
+        assert sorted(self.ran) == ['0', '1', '2', '3']
+        assert postponed == []
+        assert [(op.item, e) for op, e in failed] == [
+            ('0', error), ('1', error), ('2', error),
+        ]
+
+    def test_estimates_are_moving_averages(self):
+        scheduler = self.scheduler(100)
+        scheduler.observe('import', 10)
+        scheduler.observe('import', 20)
+
+        assert scheduler.estimate('import') == 13
+        assert scheduler.estimate('delete') == 1
@@ -0,0 +1,71 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from snyk.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.release = threading.Event()
+
+    def slow(self, result):
+        def call():
+            self.release.wait(1)
+            return result
+        return MagicMock(side_effect=call)
+
+    def test_concurrent_calls_share_one_call(self):
+        func = self.slow('orgs')
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [
+                executor.submit(self.flight.do, 'orgs', func)
+                for _ in range(4)
+            ]
+            time.sleep(0.05)
+            self.release.set()
+
+        assert [future.result() for future in futures] == ['orgs'] * 4
+        assert func.call_count == 1
+        assert len(self.flight) == 0
+
+    def test_different_keys_do_not_share(self):
+        self.release.set()
+
+        assert self.flight.do('a', lambda: 1) == 1
+        assert self.flight.do('b', lambda: 2) == 2
+
+    def test_errors_reach_every_caller(self):
+        def fail():
+            self.release.wait(1)
+            raise ValueError('nope')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(self.flight.do, 'orgs', fail)
+                for _ in range(2)
+            ]
+            time.sleep(0.05)
+            self.release.set()
+
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result()
+        assert len(self.flight) == 0
+
+    def test_forget_starts_new_calls_afresh(self):
+        first = self.slow('old')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self.flight.do, 'org/a1/projects', first)
+            time.sleep(0.05)
+            self.flight.forget('org/a1/')
+
+            assert self.flight.do('org/a1/projects', lambda: 'new') == 'new'
+            self.release.set()
+
+        assert future.result() == 'old'
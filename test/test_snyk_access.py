@@ -1,29 +1,49 @@
+import argparse
+import io
 import json
+import os
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, patch, call, mock_open
 
 import snyk
 import snyk_access
+from snyk_access import RunOptions
 
 
 class TestFindOrg(unittest.TestCase):
 
-    def test_find_org(self):
-        snyk_client = MagicMock(spec=snyk.Snyk)
-        http_client = MagicMock(spec=snyk.HTTPClient)
-        group = MagicMock(spec=snyk.Group)
+    def setUp(self):
+        self.snyk_client = snyk.Snyk('token', url='http://snyk')
         orgs = [
-            snyk.Org(http_client, f'team-{i}', str(i), group)
+            {'id': str(i), 'name': f'team-{i}', 'group': None}
             for i in range(10)
         ]
-        org_name = 'myorg'
-        orgs.append(snyk.Org(http_client, org_name, '42', group))
-        snyk_client.orgs.return_value = orgs
+        orgs.append({'id': '42', 'name': 'myorg', 'group': None})
+        self.get_json = patch.object(
+            self.snyk_client.client,
+            'get_json',
+            return_value={'orgs': orgs},
+        ).start()
+        self.addCleanup(patch.stopall)
 
-        org = snyk_access.find_org(snyk_client, org_name)
+    def test_find_org(self):
+        org = snyk_access.find_org(self.snyk_client, 'myorg')
 
         assert org.id == '42'
 
+    def test_find_org_reuses_org_list(self):
+        for i in range(10):
+            snyk_access.find_org(self.snyk_client, f'team-{i}')
+
+        assert self.get_json.call_count == 1
+
+    def test_missing_org(self):
+        with self.assertRaises(snyk.OrgNotFound):
+            snyk_access.find_org(self.snyk_client, 'nope')
+
 
 class TestFindRepos(unittest.TestCase):
 
@@ -174,6 +194,242 @@ class TestFindRepos(unittest.TestCase):
         assert sorted(repos) == ['project-a', 'project-b', 'project-e']
 
 
+class TestStreaming(unittest.TestCase):
+
+    data = [
+        {'apps': {'snyk': True}, 'repos': ['project-a', 'project-b]']},
+        {'teams': {'foo-team': 'pull'}, 'repos': ['project-c']},
+        {'apps': {'snyk': ['project-a', 'project-d']}},
+    ]
+
+    def test_yields_array_elements_across_chunk_boundaries(self):
+        text = json.dumps(self.data, indent=2)
+
+        for chunk_size in (1, 3, 7, 64):
+            elements = list(snyk_access.iter_json_array(
+                io.StringIO(text), chunk_size=chunk_size,
+            ))
+
+            assert elements == self.data
+
+    def test_empty_array(self):
+        assert list(snyk_access.iter_json_array(io.StringIO(' [ ] '))) == []
+
+    def test_array_of_scalars(self):
+        elements = snyk_access.iter_json_array(
+            io.StringIO('[1234, "x", true]'), chunk_size=2,
+        )
+
+        assert list(elements) == [1234, 'x', True]
+
+    def test_rejects_truncated_file(self):
+        with self.assertRaises(ValueError):
+            list(snyk_access.iter_json_array(io.StringIO('[{"a": 1}, {"b"')))
+
+    def test_rejects_non_array(self):
+        with self.assertRaises(ValueError):
+            list(snyk_access.iter_json_array(io.StringIO('{"a": 1}')))
+
+    def test_yields_each_repo_once(self):
+        repos = snyk_access.iter_repos_to_import(self.data)
+
+        assert list(repos) == ['project-a', 'project-b]', 'project-d']
+
+    def test_reads_items_only_as_workers_catch_up(self):
+        release = threading.Event()
+        read = []
+        done = []
+        ahead = []
+
+        def items():
+            for i in range(20):
+                ahead.append(len(read) - len(done))
+                read.append(i)
+                yield i
+
+        def work(i):
+            release.wait(1)
+            done.append(i)
+            return i * 2
+
+        timer = threading.Timer(0.05, release.set)
+        timer.start()
+        results = snyk_access.run_concurrently(work, items(), 2)
+        timer.join()
+
+        assert results == [i * 2 for i in range(20)]
+        assert max(ahead) <= 4
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'journal')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def journal(self, org_id='42', access_hash='abc'):
+        return snyk_access.Journal(self.filename, org_id, access_hash)
+
+    def test_resume_skips_recorded_operations(self):
+        journal = self.journal()
+        journal.start()
+        journal.record('import', ['project-a', 'project-b'])
+        journal.record('delete', ['1'])
+
+        resumed = self.journal()
+        resumed.resume()
+
+        assert ('import', 'project-a') in resumed
+        assert ('delete', '1') in resumed
+        assert ('import', 'project-c') not in resumed
+
+    def test_ignores_other_orgs_and_access_files(self):
+        self.journal(org_id='7').record('import', ['project-a'])
+        self.journal(access_hash='def').record('import', ['project-b'])
+
+        resumed = self.journal()
+        resumed.resume()
+
+        assert resumed.done == set()
+
+    def test_nothing_to_resume_after_a_finished_run(self):
+        journal = self.journal()
+        journal.start()
+        journal.record('import', ['project-a'])
+        journal.finish()
+
+        resumed = self.journal()
+        resumed.resume()
+
+        assert resumed.done == set()
+
+    def test_new_run_forgets_previous_run(self):
+        self.journal().record('import', ['project-a'])
+        self.journal().start()
+
+        resumed = self.journal()
+        resumed.resume()
+
+        assert resumed.done == set()
+
+    def test_tolerates_truncated_last_line(self):
+        self.journal().record('import', ['project-a'])
+        with open(self.filename, 'a') as f:
+            f.write('{"org": "42", "acc')
+
+        resumed = self.journal()
+        resumed.resume()
+
+        assert resumed.done == {('import', 'project-a')}
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = snyk_access.snapshot_file(self.dir.name, '42', 'owner')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_round_trip(self):
+        snapshot = snyk_access.Snapshot(1000.0, {'project-b', 'project-a'})
+        snyk_access.save_snapshot(self.filename, snapshot)
+
+        assert snyk_access.load_snapshot(self.filename) == snapshot
+        with open(self.filename) as f:
+            assert f.read().splitlines()[1:] == ['project-a', 'project-b']
+
+    def test_missing_snapshot(self):
+        assert snyk_access.load_snapshot(self.filename) is None
+
+    def test_corrupt_snapshot(self):
+        with open(self.filename, 'w') as f:
+            f.write('{"ful')
+
+        assert snyk_access.load_snapshot(self.filename) is None
+
+
+class TestPlanChanges(unittest.TestCase):
+
+    def setUp(self):
+        http_client = MagicMock(spec=snyk.HTTPClient)
+        org = MagicMock(spec=snyk.Org)
+        self.projects = [
+            snyk.Project(
+                http_client,
+                {
+                    'id': str(i),
+                    'name': f'owner/project-{name}:requirements.txt',
+                    'origin': 'github',
+                },
+                org,
+            )
+            for i, name in enumerate(['a', 'c'])
+        ]
+        self.projects.append(snyk.Project(
+            http_client,
+            {'id': '9', 'name': 'project-x', 'origin': 'cli'},
+            org,
+        ))
+
+    def test_imports_only_missing_repos(self):
+        plan = snyk_access.plan_changes(
+            snyk.index_by_repo(self.projects), {'project-a', 'project-b'},
+            'owner',
+        )
+
+        assert plan.to_import == ['project-b']
+        assert plan.unchanged == ['project-a']
+
+    def test_deletes_only_stale_github_projects(self):
+        plan = snyk_access.plan_changes(
+            snyk.index_by_repo(self.projects), {'project-a', 'project-b'},
+            'owner',
+        )
+
+        assert [p.id for p in plan.to_delete] == ['1']
+
+    def test_steady_state_is_a_no_op(self):
+        plan = snyk_access.plan_changes(
+            snyk.index_by_repo(self.projects), {'project-a', 'project-c'},
+            'owner',
+        )
+
+        assert plan.to_import == []
+        assert plan.to_delete == []
+
+    def test_ignores_other_owners_projects(self):
+        self.projects.append(snyk.Project(
+            self.projects[0].client,
+            {
+                'id': '7',
+                'name': 'other/project-b:requirements.txt',
+                'origin': 'github',
+            },
+            self.projects[0].org,
+        ))
+
+        plan = snyk_access.plan_changes(
+            snyk.index_by_repo(self.projects), {'project-a', 'project-c'},
+            'owner',
+        )
+
+        assert plan.to_import == []
+        assert plan.to_delete == []
+
+        plan = snyk_access.plan_changes(
+            snyk.index_by_repo(self.projects), {'project-a', 'project-b'},
+            'owner',
+        )
+
+        assert plan.to_import == ['project-b']
+        assert [p.id for p in plan.to_delete] == ['1']
+
+
 class TestSnykAccess(unittest.TestCase):
 
     @patch('snyk_access.Snyk')
@@ -194,6 +450,7 @@ class TestSnykAccess(unittest.TestCase):
         org.group = group
         orgs.append(org)
         snyk_client.orgs.return_value = orgs
+        snyk_client.org.return_value = org
         Snyk.return_value = snyk_client
 
         data = [
@@ -233,12 +490,13 @@ class TestSnykAccess(unittest.TestCase):
 
             open_.assert_called_once_with('access.json')
 
-            assert org.import_github_project.call_count == 2
-
-            org.import_github_project.assert_has_calls([
-                call('owner', 'project-a'),
-                call('owner', 'project-b'),
-            ])
+            org.import_github_projects.assert_called_once_with(
+                [
+                    ('owner', 'project-a', 'master'),
+                    ('owner', 'project-b', 'master'),
+                ],
+                batch_size=2,
+            )
 
     @patch('snyk_access.Snyk')
     @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
@@ -256,7 +514,7 @@ class TestSnykAccess(unittest.TestCase):
         org.name = org_name
         org.id = '42'
         org.group = group
-        org.projects = [
+        org.iter_projects.return_value = [
             snyk.Project(
                 http_client,
                 {
@@ -287,6 +545,7 @@ class TestSnykAccess(unittest.TestCase):
         ]
         orgs.append(org)
         snyk_client.orgs.return_value = orgs
+        snyk_client.org.return_value = org
         Snyk.return_value = snyk_client
 
         data = [
@@ -321,9 +580,740 @@ class TestSnykAccess(unittest.TestCase):
 
             snyk_access.main('owner', 'myorg', 'access.json')
 
+            org.iter_projects.assert_called_with(origin='github')
+            assert org.iter_projects.call_count == 2
             assert http_client.delete.call_count == 2
 
             http_client.delete.assert_has_calls([
                 call('org/42/project/1'),
                 call('org/42/project/2'),
-            ])
+            ], any_order=True)
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_imports_in_batches(self, Snyk):
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        org = MagicMock(spec=snyk.Org)
+        org.name = 'myorg'
+        org.iter_projects.return_value = []
+        snyk_client.org.return_value = org
+        Snyk.return_value = snyk_client
+
+        data = [{'apps': {'snyk': [f'project-{i}' for i in range(5)]}}]
+
+        with patch('snyk_access.open', mock_open(read_data=json.dumps(data))):
+
+            snyk_access.main(
+                'owner', 'myorg', 'access.json',
+                RunOptions(batch_size=2),
+            )
+
+        imported = [
+            [repo for _, repo, _ in c.args[0]]
+            for c in org.import_github_projects.call_args_list
+        ]
+        assert sorted(imported) == [
+            ['project-0', 'project-1'],
+            ['project-2', 'project-3'],
+            ['project-4'],
+        ]
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_skips_repos_already_imported(self, Snyk):
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        http_client = MagicMock(spec=snyk.HTTPClient)
+        org = MagicMock(spec=snyk.Org)
+        org.client = http_client
+        org.name = 'myorg'
+        org.id = '42'
+        org.iter_projects.return_value = [
+            snyk.Project(
+                http_client,
+                {
+                    'id': '1',
+                    'name': 'owner/project-a:requirements.txt',
+                    'origin': 'github',
+                },
+                org,
+            ),
+        ]
+        snyk_client.org.return_value = org
+        Snyk.return_value = snyk_client
+
+        data = [{'apps': {'snyk': ['project-a', 'project-b']}}]
+
+        with patch('snyk_access.open', mock_open(read_data=json.dumps(data))):
+
+            snyk_access.main('owner', 'myorg', 'access.json')
+
+            org.import_github_projects.assert_called_once_with(
+                [('owner', 'project-b', 'master')], batch_size=1,
+            )
+            http_client.delete.assert_not_called()
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_stream_imports_missing_and_removes_unlisted(self, Snyk):
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        http_client = MagicMock(spec=snyk.HTTPClient)
+        org = MagicMock(spec=snyk.Org)
+        org.client = http_client
+        org.id = '42'
+        org.import_github_projects.return_value = []
+        org.iter_projects.return_value = [
+            snyk.Project(
+                http_client,
+                {
+                    'id': str(i),
+                    'name': f'owner/project-{name}:requirements.txt',
+                    'origin': 'github',
+                },
+                org,
+            )
+            for i, name in enumerate(['a', 'z'])
+        ]
+        snyk_client.org.return_value = org
+        Snyk.return_value = snyk_client
+
+        data = [
+            {'apps': {'snyk': ['project-a', 'project-b']}},
+            {'apps': {'snyk': True}, 'repos': ['project-c', 'project-b']},
+        ]
+
+        with patch(
+            'snyk_access.open', mock_open(read_data=json.dumps(data)),
+        ) as open_:
+
+            snyk_access.main(
+                'owner', 'myorg', 'access.json',
+                RunOptions(stream=True, batch_size=1),
+            )
+
+            open_.assert_called_once_with('access.json')
+
+        org.import_github_projects.assert_has_calls([
+            call([('owner', 'project-b', 'master')], batch_size=1),
+            call([('owner', 'project-c', 'master')], batch_size=1),
+        ], any_order=True)
+        assert org.import_github_projects.call_count == 2
+        http_client.delete.assert_called_once_with('org/42/project/1')
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_resume_skips_completed_operations(self, Snyk):
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        http_client = MagicMock(spec=snyk.HTTPClient)
+        org = MagicMock(spec=snyk.Org)
+        org.client = http_client
+        org.id = '42'
+        org.import_github_projects.return_value = []
+        org.iter_projects.return_value = [
+            snyk.Project(
+                http_client,
+                {
+                    'id': str(i),
+                    'name': f'owner/project-{name}:requirements.txt',
+                    'origin': 'github',
+                },
+                org,
+            )
+            for i, name in enumerate(['x', 'y'])
+        ]
+        snyk_client.org.return_value = org
+        Snyk.return_value = snyk_client
+
+        with tempfile.TemporaryDirectory() as dir:
+            access_file = os.path.join(dir, 'access.json')
+            journal_file = os.path.join(dir, 'journal')
+            with open(access_file, 'w') as f:
+                json.dump([{'apps': {'snyk': ['project-a', 'project-b']}}], f)
+            journal = snyk_access.Journal(
+                journal_file, '42', snyk_access.file_hash(access_file),
+                'owner',
+            )
+            journal.start()
+            journal.record('import', ['project-a'])
+            journal.record('delete', ['0'])
+
+            snyk_access.main(
+                'owner', 'myorg', access_file,
+                RunOptions(journal_file=journal_file, resume=True),
+            )
+
+        org.import_github_projects.assert_called_once_with(
+            [('owner', 'project-b', 'master')], batch_size=1,
+        )
+        http_client.delete.assert_called_once_with('org/42/project/1')
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_incremental_run_applies_only_access_file_changes(self, Snyk):
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        http_client = MagicMock(spec=snyk.HTTPClient)
+        org = MagicMock(spec=snyk.Org)
+        org.client = http_client
+        org.id = '42'
+        org.import_github_projects.return_value = []
+        org.iter_projects.return_value = [
+            snyk.Project(
+                http_client,
+                {
+                    'id': str(i),
+                    'name': f'owner/project-{name}:requirements.txt',
+                    'origin': 'github',
+                },
+                org,
+            )
+            for i, name in enumerate(['a', 'b', 'x'])
+        ]
+        snyk_client.org.return_value = org
+        Snyk.return_value = snyk_client
+
+        with tempfile.TemporaryDirectory() as dir:
+            access_file = os.path.join(dir, 'access.json')
+            with open(access_file, 'w') as f:
+                json.dump([{'apps': {'snyk': ['project-a', 'project-c']}}], f)
+            snapshot_file = snyk_access.snapshot_file(dir, '42', 'owner')
+            full = time.time() - 3600
+            snyk_access.save_snapshot(snapshot_file, snyk_access.Snapshot(
+                full, {'project-a', 'project-b'},
+            ))
+
+            snyk_access.main(
+                'owner', 'myorg', access_file, RunOptions(state_dir=dir),
+            )
+
+            snapshot = snyk_access.load_snapshot(snapshot_file)
+
+        # project-x is not in the snapshot, so only a full run removes it.
+        org.import_github_projects.assert_called_once_with(
+            [('owner', 'project-c', 'master')], batch_size=1,
+        )
+        http_client.delete.assert_called_once_with('org/42/project/1')
+        assert snapshot == snyk_access.Snapshot(
+            full, {'project-a', 'project-c'},
+        )
+
+    @patch('snyk_access.wait_for_imports')
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_failed_imports_are_left_out_of_the_snapshot(
+        self, Snyk, wait_for_imports,
+    ):
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        org = MagicMock(spec=snyk.Org)
+        org.client = MagicMock(spec=snyk.HTTPClient)
+        org.id = '42'
+        org.import_github_projects.return_value = [
+            MagicMock(spec=snyk.ImportJob),
+        ]
+        org.iter_projects.return_value = []
+        snyk_client.org.return_value = org
+        Snyk.return_value = snyk_client
+        wait_for_imports.return_value = [
+            snyk.ImportResult('project-a', True, 'complete', 1.0),
+            snyk.ImportResult('project-b', False, 'failed', 1.0),
+            snyk.ImportResult('project-c', False, 'pending', 1.0),
+        ]
+
+        with tempfile.TemporaryDirectory() as dir:
+            access_file = os.path.join(dir, 'access.json')
+            with open(access_file, 'w') as f:
+                json.dump([{'apps': {'snyk': [
+                    'project-a', 'project-b', 'project-c',
+                ]}}], f)
+
+            snyk_access.main(
+                'owner', 'myorg', access_file, RunOptions(state_dir=dir),
+            )
+            snapshot = snyk_access.load_snapshot(
+                snyk_access.snapshot_file(dir, '42', 'owner'),
+            )
+
+        assert snapshot.repos == {'project-a'}
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_full_reconcile_when_snapshot_is_old(self, Snyk):
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        http_client = MagicMock(spec=snyk.HTTPClient)
+        org = MagicMock(spec=snyk.Org)
+        org.client = http_client
+        org.id = '42'
+        org.import_github_projects.return_value = []
+        org.iter_projects.return_value = [
+            snyk.Project(
+                http_client,
+                {
+                    'id': '0',
+                    'name': 'owner/project-x:requirements.txt',
+                    'origin': 'github',
+                },
+                org,
+            )
+        ]
+        snyk_client.org.return_value = org
+        Snyk.return_value = snyk_client
+
+        with tempfile.TemporaryDirectory() as dir:
+            access_file = os.path.join(dir, 'access.json')
+            with open(access_file, 'w') as f:
+                json.dump([{'apps': {'snyk': ['project-a']}}], f)
+            snapshot_file = snyk_access.snapshot_file(dir, '42', 'owner')
+            snyk_access.save_snapshot(snapshot_file, snyk_access.Snapshot(
+                time.time() - 2 * 3600, {'project-a'},
+            ))
+
+            snyk_access.main(
+                'owner', 'myorg', access_file,
+                RunOptions(state_dir=dir, full_every=1),
+            )
+
+            snapshot = snyk_access.load_snapshot(snapshot_file)
+
+        org.import_github_projects.assert_called_once_with(
+            [('owner', 'project-a', 'master')], batch_size=1,
+        )
+        http_client.delete.assert_called_once_with('org/42/project/0')
+        assert time.time() - snapshot.full < 60
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_deadline_postpones_work_for_a_full_run(self, Snyk):
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        http_client = MagicMock(spec=snyk.HTTPClient)
+        org = MagicMock(spec=snyk.Org)
+        org.client = http_client
+        org.id = '42'
+        org.import_github_projects.return_value = []
+        org.iter_projects.return_value = [
+            snyk.Project(
+                http_client,
+                {
+                    'id': '0',
+                    'name': 'owner/project-x:requirements.txt',
+                    'origin': 'github',
+                },
+                org,
+            )
+        ]
+        snyk_client.org.return_value = org
+        Snyk.return_value = snyk_client
+
+        with tempfile.TemporaryDirectory() as dir:
+            access_file = os.path.join(dir, 'access.json')
+            with open(access_file, 'w') as f:
+                json.dump([{'apps': {'snyk': ['project-a']}}], f)
+
+            with self.assertLogs(snyk_access.logger) as logs:
+                snyk_access.main(
+                    'owner', 'myorg', access_file,
+                    RunOptions(state_dir=dir, deadline=0),
+                )
+
+            snapshot = snyk_access.load_snapshot(
+                snyk_access.snapshot_file(dir, '42', 'owner'),
+            )
+
+        org.import_github_projects.assert_not_called()
+        http_client.delete.assert_not_called()
+        assert any(
+            'Postponed deletes: owner/project-x' in line
+            for line in logs.output
+        )
+        assert snapshot.full == 0
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_deadline_run_reports_failed_operations(self, Snyk):
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        http_client = MagicMock(spec=snyk.HTTPClient)
+        http_client.delete.side_effect = snyk.SnykError('boom')
+        org = MagicMock(spec=snyk.Org)
+        org.client = http_client
+        org.id = '42'
+        org.import_github_projects.return_value = []
+        org.iter_projects.return_value = [
+            snyk.Project(
+                http_client,
+                {
+                    'id': '0',
+                    'name': 'owner/project-x:requirements.txt',
+                    'origin': 'github',
+                },
+                org,
+            )
+        ]
+        snyk_client.org.return_value = org
+        Snyk.return_value = snyk_client
+
+        with tempfile.TemporaryDirectory() as dir:
+            access_file = os.path.join(dir, 'access.json')
+            with open(access_file, 'w') as f:
+                json.dump([{'apps': {'snyk': ['project-a']}}], f)
+
+            with self.assertLogs(snyk_access.logger) as logs:
+                snyk_access.main(
+                    'owner', 'myorg', access_file,
+                    RunOptions(state_dir=dir, deadline=600),
+                )
+
+            snapshot = snyk_access.load_snapshot(
+                snyk_access.snapshot_file(dir, '42', 'owner'),
+            )
+
+        org.import_github_projects.assert_called_once()
+        assert any(
+            'Removing owner/project-x:requirements.txt failed: boom' in line
+            for line in logs.output
+        )
+        assert snapshot.full == 0
+        assert snapshot.repos == {'project-a'}
+
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.manifest = os.path.join(self.dir.name, 'manifest.json')
+        with open(os.path.join(self.dir.name, 'access.json'), 'w') as f:
+            json.dump([{'apps': {'snyk': ['project-a']}}], f)
+        with open(self.manifest, 'w') as f:
+            json.dump([
+                {'owner': 'owner', 'org': org, 'access_file': 'access.json'}
+                for org in ['org-1', 'org-2']
+            ], f)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def org(self, id):
+        org = MagicMock(spec=snyk.Org)
+        org.client = MagicMock(spec=snyk.HTTPClient)
+        org.id = id
+        org.import_github_projects.return_value = []
+        org.iter_projects.return_value = []
+        return org
+
+    def test_access_files_are_relative_to_the_manifest(self):
+        assert snyk_access.load_manifest(self.manifest)[0] == (
+            snyk_access.ManifestEntry(
+                'owner', 'org-1', os.path.join(self.dir.name, 'access.json'),
+            )
+        )
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_reconciles_each_org_with_one_client(self, Snyk):
+        orgs = {'org-1': self.org('1'), 'org-2': self.org('2')}
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        snyk_client.org.side_effect = orgs.__getitem__
+        Snyk.return_value = snyk_client
+
+        with patch(
+            'snyk_access.load_repos', wraps=snyk_access.load_repos,
+        ) as load_repos:
+            failed = snyk_access.main_manifest(self.manifest)
+
+        assert failed == 0
+        Snyk.assert_called_once()
+        snyk_client.orgs.assert_called_once_with()
+        load_repos.assert_called_once()
+        for org in orgs.values():
+            org.import_github_projects.assert_called_once_with(
+                [('owner', 'project-a', 'master')], batch_size=1,
+            )
+
+    def write_manifest(self, entries):
+        with open(self.manifest, 'w') as f:
+            json.dump([
+                {'owner': owner, 'org': org, 'access_file': 'access.json'}
+                for owner, org in entries
+            ], f)
+
+    def test_rejects_an_owner_listed_twice_for_an_org(self):
+        self.write_manifest([('owner', 'org-1'), ('owner', 'org-1')])
+
+        with self.assertRaises(ValueError):
+            snyk_access.load_manifest(self.manifest)
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_owners_sharing_an_org_only_change_their_projects(self, Snyk):
+        self.write_manifest([('alice', 'org-1'), ('bob', 'org-1')])
+        org = self.org('1')
+        org.iter_projects.return_value = [
+            snyk.Project(org.client, {
+                'id': f'{owner}-{repo}',
+                'name': f'{owner}/{repo}:requirements.txt',
+                'origin': 'github',
+            }, org)
+            for owner, repo in [
+                ('alice', 'project-a'), ('alice', 'web'), ('bob', 'api'),
+            ]
+        ]
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        snyk_client.org.return_value = org
+        Snyk.return_value = snyk_client
+
+        failed = snyk_access.main_manifest(
+            self.manifest, RunOptions(org_workers=2),
+        )
+
+        assert failed == 0
+        org.import_github_projects.assert_called_once_with(
+            [('bob', 'project-a', 'master')], batch_size=1,
+        )
+        assert sorted(
+            call.args[0] for call in org.client.delete.call_args_list
+        ) == ['org/1/project/alice-web', 'org/1/project/bob-api']
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_one_failing_org_does_not_stop_the_others(self, Snyk):
+        org = self.org('2')
+        snyk_client = MagicMock(spec=snyk.Snyk)
+        snyk_client.org.side_effect = lambda name: {'org-2': org}[name]
+        Snyk.return_value = snyk_client
+
+        failed = snyk_access.main_manifest(self.manifest)
+
+        assert failed == 1
+        org.import_github_projects.assert_called_once()
+
+
+class TestWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'access.json')
+        with open(self.filename, 'w') as f:
+            f.write('[]')
+        self.stop = threading.Event()
+        self.calls = []
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def watch(self, run):
+        snyk_access.watch(self.filename, run, interval=0.001, stop=self.stop)
+
+    def test_reconciles_again_when_file_changes(self):
+        applied = snyk_access.Snapshot(time.time(), {'project-a'})
+
+        def run(previous):
+            self.calls.append(previous)
+            if len(self.calls) == 1:
+                os.utime(self.filename, ns=(0, 12345))
+            else:
+                self.stop.set()
+            return applied
+
+        self.watch(run)
+
+        assert self.calls == [None, applied]
+
+    def test_leaves_unchanged_file_alone(self):
+        def run(previous):
+            self.calls.append(previous)
+            threading.Timer(0.05, self.stop.set).start()
+            return snyk_access.Snapshot(time.time(), set())
+
+        self.watch(run)
+
+        assert self.calls == [None]
+
+    def test_runs_full_resync_when_due(self):
+        stale = snyk_access.Snapshot(0.0, set())
+
+        def run(previous):
+            self.calls.append(previous)
+            if len(self.calls) == 2:
+                self.stop.set()
+            return stale
+
+        self.watch(run)
+
+        assert self.calls == [None, stale]
+
+    def test_retries_failed_run(self):
+        def run(previous):
+            self.calls.append(previous)
+            if len(self.calls) == 1:
+                raise snyk.SnykError('boom')
+            self.stop.set()
+            return snyk_access.Snapshot(time.time(), set())
+
+        with self.assertLogs(snyk_access.logger, 'ERROR'):
+            self.watch(run)
+
+        assert self.calls == [None, None]
+
+    def test_backs_off_after_failed_runs(self):
+        ticks = iter(range(10 ** 6))
+
+        def run(previous):
+            self.calls.append(next(ticks))
+            if len(self.calls) == 5:
+                self.stop.set()
+            raise snyk.SnykError('boom')
+
+        # Each check of the clock moves it on by a tick, one per interval.
+        with self.assertLogs(snyk_access.logger, 'ERROR'):
+            snyk_access.watch(
+                self.filename, run, interval=0.001, stop=self.stop,
+                max_backoff=0.008, clock=lambda: next(ticks) * 0.001,
+            )
+
+        gaps = [b - a for a, b in zip(self.calls, self.calls[1:])]
+        assert gaps == sorted(gaps)
+        assert gaps[0] >= 2 and gaps[-1] == gaps[-2]
+
+    def test_retries_failed_run_when_file_changes(self):
+        def run(previous):
+            self.calls.append(previous)
+            if len(self.calls) == 1:
+                os.utime(self.filename, ns=(0, 12345))
+                raise snyk.SnykError('boom')
+            self.stop.set()
+            return snyk_access.Snapshot(time.time(), set())
+
+        with self.assertLogs(snyk_access.logger, 'ERROR'):
+            snyk_access.watch(
+                self.filename, run, interval=0.001, stop=self.stop,
+                clock=lambda: 0.0,
+            )
+
+        assert self.calls == [None, None]
+
+
+class TestPlanApply(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.plan_file = os.path.join(self.dir.name, 'plan.jsonl')
+        self.http_client = MagicMock(spec=snyk.HTTPClient)
+        self.org = snyk.Org(
+            self.http_client, 'myorg', '42', None,
+            integrations={'github': '7'},
+        )
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write_plan(self):
+        snyk_access.write_plan(
+            self.plan_file, self.org, 'owner', snyk_access.Plan(
+                to_import=['project-a', 'project-b', 'project-c'],
+                to_delete=[snyk.Project(
+                    self.http_client,
+                    {
+                        'id': '1',
+                        'name': 'owner/project-x:requirements.txt',
+                        'origin': 'github',
+                    },
+                    self.org,
+                )],
+                unchanged=[],
+            ),
+        )
+
+    def test_shards_split_the_operations(self):
+        self.write_plan()
+
+        header, first = snyk_access.read_plan(self.plan_file, (1, 2))
+        _, second = snyk_access.read_plan(self.plan_file, (2, 2))
+
+        assert header['org'] == '42'
+        assert header['integration'] == '7'
+        assert [op.get('repo') for op in first] == ['project-a', 'project-c']
+        assert second == [
+            {'op': 'import', 'repo': 'project-b'},
+            {
+                'op': 'delete', 'project': '1',
+                'name': 'owner/project-x:requirements.txt',
+            },
+        ]
+
+    def test_parse_shard(self):
+        assert snyk_access.parse_shard('2/8') == (2, 8)
+        for value in ('0/8', '9/8', 'two'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                snyk_access.parse_shard(value)
+
+    def test_commands_share_options_with_a_full_run(self):
+        options = ['--max-rps', '2', '--workers', '3', '--journal', 'j']
+
+        run = snyk_access.main_parser().parse_args(options)
+        apply = snyk_access.command_parser().parse_args(
+            ['apply', 'plan.jsonl', *options],
+        )
+
+        shared = ('max_rps', 'max_retries', 'workers', 'import_batch_size',
+                  'import_timeout', 'journal', 'resume')
+        assert [getattr(apply, name) for name in shared] == [
+            getattr(run, name) for name in shared
+        ]
+
+    def test_run_options_from_args(self):
+        args = snyk_access.main_parser().parse_args([
+            '--import-batch-size', '10', '--journal', 'j', '--metrics', 'm',
+            '--profile', 'p', '--deadline', '60',
+        ])
+
+        assert RunOptions.from_args(args) == RunOptions(
+            batch_size=10, journal_file='j', metrics_file='m',
+            profile_dir='p', deadline=60,
+        )
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_plan_only_reads(self, Snyk):
+        org = MagicMock(spec=snyk.Org)
+        org.client = self.http_client
+        org.id = '42'
+        org.name = 'myorg'
+        org.integrations = {'github': '7'}
+        org.iter_projects.return_value = [snyk.Project(
+            self.http_client,
+            {
+                'id': '1',
+                'name': 'owner/project-x:requirements.txt',
+                'origin': 'github',
+            },
+            org,
+        )]
+        Snyk.return_value.org.return_value = org
+        access_file = os.path.join(self.dir.name, 'access.json')
+        with open(access_file, 'w') as f:
+            json.dump([{'apps': {'snyk': ['project-a']}}], f)
+
+        snyk_access.main_plan('owner', 'myorg', access_file, self.plan_file)
+
+        _, operations = snyk_access.read_plan(self.plan_file)
+        assert [op['op'] for op in operations] == ['import', 'delete']
+        org.import_github_projects.assert_not_called()
+        self.http_client.delete.assert_not_called()
+
+    @patch('snyk_access.Snyk')
+    @patch.dict('snyk_access.os.environ', {'SNYK_TOKEN': 'token'})
+    def test_apply_runs_shard_without_fetching_org(self, Snyk):
+        self.write_plan()
+        snyk_client = Snyk.return_value
+        snyk_client.client = self.http_client
+        self.http_client.pool = MagicMock()
+        self.http_client.bytes_received = self.http_client.bytes_decoded = 0
+        self.http_client.request.return_value = snyk.Response(201, {}, b'')
+
+        snyk_access.main_apply(self.plan_file, shard=(2, 2))
+
+        snyk_client.org.assert_not_called()
+        snyk_client.orgs.assert_not_called()
+        self.http_client.get_json.assert_not_called()
+        self.http_client.request.assert_called_once_with(
+            'POST', 'org/42/integrations/7/import', {'targets': [
+                {'owner': 'owner', 'name': 'project-b', 'branch': 'master'},
+            ]},
+        )
+        self.http_client.delete.assert_called_once_with('org/42/project/1')